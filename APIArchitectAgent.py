@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
 from StructuredAgent import StructuredAgent
+from CallBudget import CallBudget
+from LLMScheduler import PRIORITY_ARCHITECT
 
 class APIEndpoint(BaseModel):
     NAME: str = Field(description="Simple name of the endpoint, no special characters, unique for each endpoint")
@@ -16,7 +18,7 @@ class APIDefinition(BaseModel):
     DATA_STORAGE: str = Field(description="Description of the data storage requirements")
 
 class APIArchitectAgent:
-    def __init__(self, model):
+    def __init__(self, model, **agent_options):
 
         system_message_template ="""
 You are a expert at designing software APIs in AWS.  You know how to use all the core systems of AWS and combine
@@ -29,7 +31,29 @@ Description of the API:
 
 {description}
 """
-        self._agent = StructuredAgent(model, system_message_template, APIDefinition)
+        self._agent = StructuredAgent(model, system_message_template, APIDefinition, priority=PRIORITY_ARCHITECT, name="api_architect", **agent_options)
 
-    def create_design(self, system_description) -> APIDefinition:
-        return self._agent.reply("Create the API Design", {"description": system_description})
\ No newline at end of file
+    def _charge(self, budget: CallBudget, prompt: str, merge_data: dict, design):
+        if budget is not None:
+            budget.charge("api_definition.json", 1, self._agent.estimate_tokens(prompt, merge_data, design))
+
+    @staticmethod
+    def _request(system_description, previous_design: APIDefinition):
+        # with an earlier design the architect updates it, so endpoints the change does not touch come back as they were
+        if previous_design is None:
+            return "Create the API Design", {"description": system_description}
+
+        return ("Update the API Design.  Keep every endpoint the description does not change exactly as it is in the current design:\n\n{previous_design}",
+                {"description": system_description, "previous_design": previous_design.model_dump_json()})
+
+    def create_design(self, system_description, budget: CallBudget = None, previous_design: APIDefinition = None) -> APIDefinition:
+        prompt, merge_data = self._request(system_description, previous_design)
+        design = self._agent.reply(prompt, merge_data, "api_definition.json")
+        self._charge(budget, prompt, merge_data, design)
+        return design
+
+    async def acreate_design(self, system_description, budget: CallBudget = None, previous_design: APIDefinition = None) -> APIDefinition:
+        prompt, merge_data = self._request(system_description, previous_design)
+        design = await self._agent.areply(prompt, merge_data, "api_definition.json")
+        self._charge(budget, prompt, merge_data, design)
+        return design
\ No newline at end of file
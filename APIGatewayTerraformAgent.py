@@ -1,8 +1,12 @@
 from CodeBaseModels import CodeFile, CodeReview
 from StructuredAgent import StructuredAgent
+from CodeValidators import TerraformValidator
+from ReviewLoop import ReviewLoop
+from CallBudget import CallBudget
+from LLMScheduler import PRIORITY_WRITER, PRIORITY_REVIEWER
 
 class APIGatewayTerraformAgent:
-    def __init__(self, model):
+    def __init__(self, model, validators: list = None, candidates: int = 1, **agent_options):
         writer_system_message_template = """
 You are an expert at writing Terraform.  You will be given an API definition that includes the endpoints, request and response parameters, and data storage requirements.  
 Review the API definition and generate a corresponding Terraform script that will create an API Gateway on AWS.  
@@ -55,23 +59,17 @@ Current Terraform Script:
 {script}
 """
 
-        self._writer_agent = StructuredAgent(model, writer_system_message_template, CodeFile)
-        self._reviewer_agent = StructuredAgent(model, reviewer_system_message_template, CodeReview)
-
-    def write_terraform(self, endpoints, min_quality_score: int = 8, max_review_iterations: int = 3) -> CodeFile:
-        review = ""
-        code = ""
-        review_score = 0
-        review_count = 0
-
-        while (review_score < min_quality_score and review_count < max_review_iterations):
-            terraform_script: CodeFile = self._writer_agent.reply("Create or improve the Terraform Script", {"endpoints": endpoints, "code": code, "review": review})
-
-            code = terraform_script.RAW_CODE
-            
-            if terraform_script:
-                terraform_review: CodeReview = self._reviewer_agent.reply("Review the Terraform Script", {"endpoints": endpoints, "script": code})
-                review = terraform_review.REVIEW
-                review_score = terraform_review.SCORE
-                review_count += 1
-        return terraform_script
\ No newline at end of file
+        self._writer_agent = StructuredAgent(model, writer_system_message_template, CodeFile, priority=PRIORITY_WRITER, name="api_gateway_terraform_writer", **agent_options)
+        self._reviewer_agent = StructuredAgent(model, reviewer_system_message_template, CodeReview, priority=PRIORITY_REVIEWER, name="api_gateway_terraform_reviewer", **agent_options)
+
+        # local checks that run before a draft is sent to the reviewer
+        validators = validators if validators is not None else [TerraformValidator(forbidden_blocks=("provider",))]
+
+        self._review_loop = ReviewLoop(self._writer_agent, self._reviewer_agent, "Create or improve the Terraform Script", "Review the Terraform Script", validators, reviewer_code_key="script", candidates=candidates,
+                                       name="api_gateway_terraform", telemetry=agent_options.get("telemetry"), router=agent_options.get("router"))
+
+    def write_terraform(self, endpoints, min_quality_score: int = 8, max_review_iterations: int = 3, budget: CallBudget = None, artifact: str = None) -> CodeFile:
+        return self._review_loop.run({"endpoints": endpoints}, min_quality_score, max_review_iterations, budget, artifact or "APIGateway.tf")
+
+    async def awrite_terraform(self, endpoints, min_quality_score: int = 8, max_review_iterations: int = 3, budget: CallBudget = None, artifact: str = None) -> CodeFile:
+        return await self._review_loop.arun({"endpoints": endpoints}, min_quality_score, max_review_iterations, budget, artifact or "APIGateway.tf")
\ No newline at end of file
@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import time
+from pydantic import BaseModel
+from CodeBaseModels import CodeFile
+
+class ArtifactWriter:
+    # state keys written as soon as a node emits them, and the file each one goes to
+    JSON_ARTIFACTS = {"APIDefinition": "api_definition.json", "DatabaseArchitecture": "database_schema.json"}
+    CODE_ARTIFACTS = {"APIGatewayTerraformScript": "APIGateway.tf", "DatabaseTerraformScript": "Database.tf"}
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.written: list[str] = []
+        self.errors: list[tuple[str, str]] = []
+        os.makedirs(folder, exist_ok=True)
+
+    def write_text(self, filename: str, content: str):
+        # never let a generated file name escape the output folder
+        path = os.path.join(self.folder, os.path.basename(filename))
+        temp_path = None
+        try:
+            # write to a temporary file next to the target and swap it in, so a file is either complete or absent
+            with tempfile.NamedTemporaryFile("w", dir=self.folder, prefix=".tmp-", suffix=".part", delete=False, encoding="utf-8") as f:
+                temp_path = f.name
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+            self.written.append(path)
+        except Exception as e:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+            self.errors.append((path, str(e)))
+            print(f"Error writing {path}: {e}")
+
+    def write_update(self, update: dict):
+        for key, filename in self.JSON_ARTIFACTS.items():
+            value = update.get(key)
+            if isinstance(value, BaseModel):
+                self.write_text(filename, value.model_dump_json(indent=4))
+
+        for key, filename in self.CODE_ARTIFACTS.items():
+            value = update.get(key)
+            if isinstance(value, CodeFile):
+                self.write_text(filename, value.RAW_CODE)
+
+        for lambda_function in update.get("LambdaFunctionList") or []:
+            if isinstance(lambda_function, CodeFile):
+                self.write_text(lambda_function.FILENAME, lambda_function.RAW_CODE)
+
+    def write_json(self, filename: str, value):
+        self.write_text(filename, json.dumps(value, indent=4, default=str))
+
+
+async def astream_progress(app, inputs, config: dict, writer: ArtifactWriter):
+    # runs the graph, writes every artifact as soon as the node that produced it finishes and yields progress events:
+    # node_started / node_finished, artifact (a file was written), the nodes' own events such as review rounds,
+    # and run_finished with the final state
+    final_state = {}
+    started_at = {}
+    async for mode, chunk in app.astream(inputs, config=config, stream_mode=["updates", "values", "tasks", "custom"]):
+        if mode == "values":
+            final_state = chunk
+        elif mode == "custom":
+            yield chunk
+        elif mode == "tasks":
+            if "result" not in chunk:
+                started_at[chunk["id"]] = time.perf_counter()
+                yield {"type": "node_started", "node": chunk["name"], "task_id": chunk["id"]}
+            else:
+                seconds = time.perf_counter() - started_at.pop(chunk["id"], time.perf_counter())
+                yield {"type": "node_finished", "node": chunk["name"], "task_id": chunk["id"], "seconds": seconds, "error": chunk.get("error")}
+        else:
+            written = len(writer.written)
+            for update in chunk.values():
+                if isinstance(update, dict):
+                    writer.write_update(update)
+            for path in writer.written[written:]:
+                yield {"type": "artifact", "path": path}
+
+    yield {"type": "run_finished", "state": final_state}
+
+
+async def astream_artifacts(app, inputs, config: dict, writer: ArtifactWriter) -> dict:
+    # run the graph and write every artifact as soon as the node that produced it finishes
+    final_state = {}
+    async for event in astream_progress(app, inputs, config, writer):
+        if event["type"] == "run_finished":
+            final_state = event["state"]
+
+    return final_state
@@ -0,0 +1,221 @@
+import threading
+
+class CallBudget:
+    """
+    LLM call and token budget for one dev team run.
+
+    Every review loop asks the budget before each round.  A loop stops when its score reaches
+    min_quality_score, when the score has not improved for `patience` rounds, when it has used
+    max_review_iterations rounds or when the run-wide call/token cap is spent.  When a cap is
+    set, budget left after reserving one round for every unfinished artifact is handed out as
+    extra rounds (up to max_extra_iterations) to artifacts whose score is still improving.
+    An approved round holds back its calls and tokens until it is charged, so rounds running at
+    the same time cannot overrun the caps together.
+
+    An artifact written in a worker process gets its own budget, capped at an equal share of
+    what is left for it and every artifact still to be written (see worker_settings).  The share
+    stays reserved until the worker's report is merged back.
+    """
+
+    def __init__(self, max_calls: int = None, max_tokens: int = None, min_quality_score: int = 8, max_review_iterations: int = 3,
+                 patience: int = 1, max_extra_iterations: int = 2):
+        self.max_calls = max_calls
+        self.max_tokens = max_tokens
+        self.min_quality_score = min_quality_score
+        self.max_review_iterations = max_review_iterations
+        self.patience = patience
+        self.max_extra_iterations = max_extra_iterations
+
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._tokens = 0
+        self._expected = 0
+        self._reserved_calls = 0
+        self._reserved_tokens = 0
+        self._artifacts = {}
+
+    def _artifact(self, artifact: str) -> dict:
+        return self._artifacts.setdefault(artifact, {"calls": 0, "tokens": 0, "scores": [], "started": False, "finished": False, "stop_reason": None, "round_calls": 0,
+                                                     "round_tokens": 0, "in_worker": False, "reserved_calls": 0, "reserved_tokens": 0})
+
+    def expect(self, count: int):
+        # artifacts that will be written later still need their first round reserved
+        with self._lock:
+            self._expected += count
+
+    def charge(self, artifact: str, calls: int, tokens: int):
+        with self._lock:
+            self._calls += calls
+            self._tokens += tokens
+            entry = self._artifact(artifact)
+            entry["calls"] += calls
+            entry["tokens"] += tokens
+            entry["round_tokens"] = max(entry["round_tokens"], tokens)
+            self._release(entry)
+
+    def record_round(self, artifact: str, score: int, calls: int):
+        with self._lock:
+            entry = self._artifact(artifact)
+            entry["scores"].append(score)
+            entry["round_calls"] = max(entry["round_calls"], calls)
+
+    def exhausted(self) -> bool:
+        with self._lock:
+            return self._exhausted()
+
+    def _exhausted(self) -> bool:
+        return (self.max_calls is not None and self._calls >= self.max_calls) or (self.max_tokens is not None and self._tokens >= self.max_tokens)
+
+    def _plateaued(self, scores: list[int]) -> bool:
+        if len(scores) <= self.patience:
+            return False
+
+        return max(scores[-self.patience:]) <= max(scores[:-self.patience])
+
+    def _spare_calls(self, artifact: str) -> int:
+        # calls left once every other unfinished or expected artifact has one round reserved
+        if self.max_calls is None:
+            return 0
+
+        # a round that is already running has its calls in _reserved_calls
+        unfinished = [name for name in self._unfinished(artifact) if not self._artifacts[name]["reserved_calls"]]
+        round_calls = max([entry["round_calls"] for entry in self._artifacts.values()] + [1])
+        reserved = (len(unfinished) + self._expected) * round_calls + self._reserved_calls
+
+        return self.max_calls - self._calls - reserved
+
+    def _unfinished(self, artifact: str) -> list[str]:
+        # other artifacts that are being written here, a worker's artifact has its share reserved instead
+        return [name for name, entry in self._artifacts.items()
+                if entry["started"] and not entry["finished"] and not entry["in_worker"] and name != artifact]
+
+    def _share(self, cap: int, used: int, reserved: int, artifact: str):
+        # an equal part of what is left of a cap for this artifact and every other one still to be written
+        if cap is None:
+            return None
+
+        return max(0, (cap - used - reserved) // (self._expected + len(self._unfinished(artifact)) + 1))
+
+    def _round_size(self, entry: dict) -> tuple:
+        # calls and tokens held back for the next round, a first round is taken to be as large as the largest one seen
+        calls = entry["round_calls"] or max([other["round_calls"] for other in self._artifacts.values()] + [1])
+        tokens = entry["round_tokens"] or max([other["round_tokens"] for other in self._artifacts.values()] + [0])
+        return calls, tokens
+
+    def _round_fits(self, entry: dict) -> bool:
+        calls, tokens = self._round_size(entry)
+        return ((self.max_calls is None or self._calls + self._reserved_calls + calls <= self.max_calls)
+                and (self.max_tokens is None or self._tokens + self._reserved_tokens + tokens <= self.max_tokens))
+
+    def should_continue(self, artifact: str) -> bool:
+        with self._lock:
+            entry = self._artifact(artifact)
+            scores = entry["scores"]
+            if not entry["started"]:
+                entry["started"] = True
+                self._expected = max(0, self._expected - 1)
+
+            # the first round always runs so every artifact gets a draft
+            reason = None
+            if scores:
+                if max(scores) >= self.min_quality_score:
+                    reason = "quality_reached"
+                elif self._exhausted() or not self._round_fits(entry):
+                    reason = "budget_exhausted"
+                elif self._plateaued(scores):
+                    reason = "plateau"
+                elif len(scores) >= self.max_review_iterations:
+                    improving = len(scores) < 2 or scores[-1] > max(scores[:-1])
+                    extra_rounds = len(scores) - self.max_review_iterations
+                    if not improving or extra_rounds >= self.max_extra_iterations or self._spare_calls(artifact) < entry["round_calls"]:
+                        reason = "max_iterations"
+
+            if reason is not None:
+                entry["finished"] = True
+                entry["stop_reason"] = reason
+                return False
+
+            # the approved round is settled by charge
+            self._release(entry)
+            entry["reserved_calls"], entry["reserved_tokens"] = self._round_size(entry)
+            self._reserved_calls += entry["reserved_calls"]
+            self._reserved_tokens += entry["reserved_tokens"]
+            return True
+
+    def worker_settings(self, artifact: str) -> dict:
+        # arguments for the CallBudget a worker process writes `artifact` with, its caps are reserved here until merge
+        with self._lock:
+            entry = self._artifact(artifact)
+            if not entry["started"]:
+                entry["started"] = True
+                self._expected = max(0, self._expected - 1)
+            self._release(entry)
+            max_calls = self._share(self.max_calls, self._calls, self._reserved_calls, artifact)
+            max_tokens = self._share(self.max_tokens, self._tokens, self._reserved_tokens, artifact)
+            entry["in_worker"] = True
+            entry["reserved_calls"] = max_calls or 0
+            entry["reserved_tokens"] = max_tokens or 0
+            self._reserved_calls += entry["reserved_calls"]
+            self._reserved_tokens += entry["reserved_tokens"]
+            return {
+                "max_calls": max_calls,
+                "max_tokens": max_tokens,
+                "min_quality_score": self.min_quality_score,
+                "max_review_iterations": self.max_review_iterations,
+                "patience": self.patience,
+                "max_extra_iterations": self.max_extra_iterations,
+            }
+
+    def reuse(self, artifact: str):
+        # an artifact an incremental run copies from the earlier run, its reserved first round is handed back
+        with self._lock:
+            entry = self._artifact(artifact)
+            if not entry["started"]:
+                entry["started"] = True
+                self._expected = max(0, self._expected - 1)
+            entry["finished"] = True
+            entry["stop_reason"] = "reused"
+
+    def release(self, artifact: str):
+        # gives back the share reserved for a worker task that failed
+        with self._lock:
+            entry = self._artifact(artifact)
+            self._release(entry)
+            entry["in_worker"] = False
+
+    def _release(self, entry: dict):
+        # gives back what is held for an artifact, its running round or its worker's share
+        self._reserved_calls -= entry["reserved_calls"]
+        self._reserved_tokens -= entry["reserved_tokens"]
+        entry["reserved_calls"] = entry["reserved_tokens"] = 0
+
+    def merge(self, artifact: str, report: dict):
+        # adds an artifact that was written under a worker's budget, see worker_settings
+        with self._lock:
+            entry = self._artifact(artifact)
+            if not entry["started"]:
+                entry["started"] = True
+                self._expected = max(0, self._expected - 1)
+            self._release(entry)
+            self._calls += report.get("calls", 0)
+            self._tokens += report.get("tokens", 0)
+            entry["calls"] += report.get("calls", 0)
+            entry["tokens"] += report.get("tokens", 0)
+            entry["scores"].extend(report.get("scores", []))
+            entry["finished"] = True
+            entry["stop_reason"] = report.get("stop_reason")
+
+    def report(self) -> dict:
+        with self._lock:
+            artifacts = {name: {"calls": entry["calls"], "tokens": entry["tokens"], "scores": list(entry["scores"]), "stop_reason": entry["stop_reason"]}
+                         for name, entry in self._artifacts.items()}
+            return {
+                "max_calls": self.max_calls,
+                "max_tokens": self.max_tokens,
+                "calls": self._calls,
+                "tokens": self._tokens,
+                "artifacts": artifacts,
+            }
+
+    def artifact_report(self, artifact: str) -> dict:
+        return self.report()["artifacts"].get(artifact, {})
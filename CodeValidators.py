@@ -0,0 +1,159 @@
+import ast
+import re
+from CodeBaseModels import CodeFile
+
+# python-hcl2 gives a full HCL parse when it is installed, otherwise a structural check is used
+try:
+    import hcl2
+except ImportError:
+    hcl2 = None
+
+
+# Validators run locally on every draft before it is sent to the reviewer agent.  Each one
+# returns a list of findings, an empty list means the draft can go to the reviewer.
+
+def run_validators(validators: list, code_file: CodeFile) -> list[str]:
+    findings = []
+    for validator in validators:
+        findings.extend(validator.validate(code_file))
+
+    return findings
+
+
+def format_findings(findings: list[str]) -> str:
+    return "The code failed automated validation and was not reviewed.  Fix these problems:\n\n" + "\n".join(f"- {finding}" for finding in findings)
+
+
+def _fence_findings(code: str) -> list[str]:
+    if "```" in code:
+        return ["The code contains ``` markdown fences, return only the raw code"]
+
+    return []
+
+
+class LambdaValidator:
+    def __init__(self, handler_name: str = "lambda_handler", handler_arguments: tuple = ("event", "context")):
+        self._handler_name = handler_name
+        self._handler_arguments = list(handler_arguments)
+
+    def validate(self, code_file: CodeFile) -> list[str]:
+        code = code_file.RAW_CODE
+        findings = _fence_findings(code)
+
+        if not re.fullmatch(r"[a-z0-9_]+\.py", code_file.FILENAME or ""):
+            findings.append(f"The file name '{code_file.FILENAME}' should be the endpoint name in lower case with underscores and a .py extension")
+
+        try:
+            tree = ast.parse(code)
+        except SyntaxError as e:
+            findings.append(f"The code is not valid python: {e.msg} (line {e.lineno})")
+            return findings
+
+        handlers = [node for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == self._handler_name]
+        if not handlers:
+            findings.append(f"There is no top level '{self._handler_name}({', '.join(self._handler_arguments)})' function")
+        elif [argument.arg for argument in handlers[0].args.args] != self._handler_arguments:
+            findings.append(f"'{self._handler_name}' must take exactly these arguments: {', '.join(self._handler_arguments)}")
+
+        imported_modules = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                imported_modules.update(alias.name.split(".")[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                imported_modules.add(node.module.split(".")[0])
+
+        if "boto3" not in imported_modules:
+            findings.append("The code does not import boto3 to interact with AWS services")
+
+        return findings
+
+
+class TerraformValidator:
+    def __init__(self, forbidden_blocks: tuple = ("provider",)):
+        self._forbidden_blocks = forbidden_blocks
+
+    def validate(self, code_file: CodeFile) -> list[str]:
+        code = code_file.RAW_CODE
+        findings = _fence_findings(code)
+
+        if not code.strip():
+            findings.append("The script is empty")
+            return findings
+
+        findings.extend(self._syntax_findings(code))
+
+        for block in self._forbidden_blocks:
+            if re.search(rf'^\s*{block}\s*("[^"]*"\s*)?\{{', code, re.MULTILINE):
+                findings.append(f"The script contains a '{block}' block, it is supplied by a different script and must be removed")
+
+        return findings
+
+    def _syntax_findings(self, code: str) -> list[str]:
+        if hcl2 is not None:
+            try:
+                hcl2.loads(code)
+            except Exception as e:
+                return [f"The script is not valid HCL: {str(e).splitlines()[0] if str(e) else type(e).__name__}"]
+            return []
+
+        return _structural_findings(code)
+
+
+def _structural_findings(code: str) -> list[str]:
+    # bracket and string balance check that skips comments, strings and heredocs
+    pairs = {"}": "{", "]": "[", ")": "("}
+    stack = []
+    line_number = 1
+    index = 0
+    length = len(code)
+
+    while index < length:
+        character = code[index]
+
+        if character == "\n":
+            line_number += 1
+        elif character == "#" or code.startswith("//", index):
+            index = code.find("\n", index)
+            if index == -1:
+                break
+            continue
+        elif code.startswith("/*", index):
+            end = code.find("*/", index + 2)
+            if end == -1:
+                return [f"Unterminated block comment starting on line {line_number}"]
+            line_number += code.count("\n", index, end)
+            index = end + 2
+            continue
+        elif code.startswith("<<", index):
+            heredoc = re.match(r"<<-?([A-Za-z_][A-Za-z0-9_]*)\n", code[index:])
+            if heredoc:
+                end = re.compile(rf"^\s*{heredoc.group(1)}\s*$", re.MULTILINE).search(code, index + heredoc.end())
+                if end is None:
+                    return [f"Unterminated heredoc '{heredoc.group(1)}' starting on line {line_number}"]
+                line_number += code.count("\n", index, end.end())
+                index = end.end()
+                continue
+        elif character == '"':
+            start_line = line_number
+            index += 1
+            while index < length and code[index] != '"':
+                if code[index] == "\\":
+                    index += 1
+                elif code[index] == "\n":
+                    return [f"Unterminated string on line {start_line}"]
+                index += 1
+            if index >= length:
+                return [f"Unterminated string on line {start_line}"]
+        elif character in "{[(":
+            stack.append((character, line_number))
+        elif character in pairs:
+            if not stack or stack[-1][0] != pairs[character]:
+                return [f"Unexpected '{character}' on line {line_number}"]
+            stack.pop()
+
+        index += 1
+
+    if stack:
+        return [f"Unclosed '{stack[-1][0]}' opened on line {stack[-1][1]}"]
+
+    return []
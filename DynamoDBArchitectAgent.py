@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
 from StructuredAgent import StructuredAgent
+from CallBudget import CallBudget
+from LLMScheduler import PRIORITY_ARCHITECT
 
 # Define the structured output of the model
 class DynamoIndex(BaseModel):
@@ -24,7 +26,7 @@ class DynamoTables(BaseModel):
     TABLES: list[DynamoTable] = Field(description="Tables for the database")
 
 class DynamoDBArchitectAgent:
-    def __init__(self, model):
+    def __init__(self, model, **agent_options):
         system_message_template = """
 You are an expert at designing databases in DynamoDB for AWS.  
 You will be given the description of an API Gateway and it's endpoints.  
@@ -39,7 +41,29 @@ API Endpoints:
 
 {endpoints}
 """
-        self._agent = StructuredAgent(model, system_message_template, DynamoTables)
+        self._agent = StructuredAgent(model, system_message_template, DynamoTables, priority=PRIORITY_ARCHITECT, name="dynamodb_architect", **agent_options)
 
-    def create_design(self, system_description, endpoints) -> DynamoTables:
-        return self._agent.reply("Create the Database Design", {"description": system_description, "endpoints": endpoints})
\ No newline at end of file
+    def _charge(self, budget: CallBudget, prompt: str, merge_data: dict, design):
+        if budget is not None:
+            budget.charge("database_schema.json", 1, self._agent.estimate_tokens(prompt, merge_data, design))
+
+    @staticmethod
+    def _request(system_description, endpoints, previous_design: DynamoTables):
+        # with an earlier design the architect updates it, so tables the change does not touch come back as they were
+        if previous_design is None:
+            return "Create the Database Design", {"description": system_description, "endpoints": endpoints}
+
+        return ("Update the Database Design.  Keep every table the endpoints do not change exactly as it is in the current design:\n\n{previous_design}",
+                {"description": system_description, "endpoints": endpoints, "previous_design": previous_design.model_dump_json()})
+
+    def create_design(self, system_description, endpoints, budget: CallBudget = None, previous_design: DynamoTables = None) -> DynamoTables:
+        prompt, merge_data = self._request(system_description, endpoints, previous_design)
+        design = self._agent.reply(prompt, merge_data, "database_schema.json")
+        self._charge(budget, prompt, merge_data, design)
+        return design
+
+    async def acreate_design(self, system_description, endpoints, budget: CallBudget = None, previous_design: DynamoTables = None) -> DynamoTables:
+        prompt, merge_data = self._request(system_description, endpoints, previous_design)
+        design = await self._agent.areply(prompt, merge_data, "database_schema.json")
+        self._charge(budget, prompt, merge_data, design)
+        return design
\ No newline at end of file
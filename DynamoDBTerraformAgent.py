@@ -1,8 +1,12 @@
 from CodeBaseModels import CodeFile, CodeReview
 from StructuredAgent import StructuredAgent
+from CodeValidators import TerraformValidator
+from ReviewLoop import ReviewLoop
+from CallBudget import CallBudget
+from LLMScheduler import PRIORITY_WRITER, PRIORITY_REVIEWER
 
 class DynamoDBTerraformAgent:
-    def __init__(self, model):
+    def __init__(self, model, validators: list = None, candidates: int = 1, **agent_options):
         writer_system_message_template = """
 You are an expert at writting Terraform.  You will be given a database design.  
 Review the design and generate a corresponding Terraform script that will create a DynamoDB table on AWS. 
@@ -40,24 +44,17 @@ Current Terraform Script:
 {script}
 """
 
-        self._writer_agent = StructuredAgent(model, writer_system_message_template, CodeFile)
-        self._reviewer_agent = StructuredAgent(model, reviewer_system_message_template, CodeReview)
+        self._writer_agent = StructuredAgent(model, writer_system_message_template, CodeFile, priority=PRIORITY_WRITER, name="dynamodb_terraform_writer", **agent_options)
+        self._reviewer_agent = StructuredAgent(model, reviewer_system_message_template, CodeReview, priority=PRIORITY_REVIEWER, name="dynamodb_terraform_reviewer", **agent_options)
 
-    def write_terraform(self, design, min_quality_score: int = 8, max_review_iterations: int = 3) -> CodeFile:
-        review = ""
-        code = ""
-        review_score = 0
-        review_count = 0
+        # local checks that run before a draft is sent to the reviewer
+        validators = validators if validators is not None else [TerraformValidator(forbidden_blocks=("provider", "terraform"))]
 
-        while (review_score < min_quality_score and review_count < max_review_iterations):
-            terraform_script: CodeFile = self._writer_agent.reply("Create or improve the Terraform Script", {"design": design, "code": code, "review": review})
+        self._review_loop = ReviewLoop(self._writer_agent, self._reviewer_agent, "Create or improve the Terraform Script", "Review the Terraform Script", validators, reviewer_code_key="script", candidates=candidates,
+                                       name="dynamodb_terraform", telemetry=agent_options.get("telemetry"), router=agent_options.get("router"))
 
-            code = terraform_script.RAW_CODE
-            
-            if terraform_script:
-                terraform_review: CodeReview = self._reviewer_agent.reply("Review the Terraform Script", {"design": design, "script": code})
-                review = terraform_review.REVIEW
-                review_score = terraform_review.SCORE
-                review_count += 1
+    def write_terraform(self, design, min_quality_score: int = 8, max_review_iterations: int = 3, budget: CallBudget = None, artifact: str = None) -> CodeFile:
+        return self._review_loop.run({"design": design}, min_quality_score, max_review_iterations, budget, artifact or "Database.tf")
 
-        return terraform_script
\ No newline at end of file
+    async def awrite_terraform(self, design, min_quality_score: int = 8, max_review_iterations: int = 3, budget: CallBudget = None, artifact: str = None) -> CodeFile:
+        return await self._review_loop.arun({"design": design}, min_quality_score, max_review_iterations, budget, artifact or "Database.tf")
\ No newline at end of file
@@ -0,0 +1,184 @@
+import asyncio
+import itertools
+import random
+import re
+import threading
+import time
+import types
+import typing
+from typing import Any
+from pydantic import BaseModel, PrivateAttr
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from APIArchitectAgent import APIDefinition, APIEndpoint
+from DynamoDBArchitectAgent import DynamoTables, DynamoTable, DynamoIndex, DynamoAttribute
+from CodeBaseModels import CodeFile, CodeReview
+from ResearchPlannerAgent import ResearchPlan
+from LLMScheduler import estimate_tokens
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline, deterministic stand-in for the Azure chat models.
+
+    Structured output calls return schema-valid APIDefinition, DynamoTables, CodeFile,
+    CodeReview and ResearchPlan objects (and a generic instance for any other pydantic schema).  Tool-bound
+    calls, like the research agent's, request `research_tool_calls` on the first turn and
+    answer in text once the tool results are in.  Latency, jitter, the failure rate, a share
+    of slow (tail latency) and of malformed structured replies, and the sequence of review
+    scores handed to each artifact are configurable.
+    """
+
+    model_name: str = "fake-chat-model"
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    failure_rate: float = 0.0
+    slow_rate: float = 0.0
+    slow_latency: float = 0.0
+    malformed_rate: float = 0.0
+    score_sequence: list[int] = [9]
+    endpoints: int = 3
+    tables: int = 2
+    research_tool_calls: list[dict] = [{"name": "weather_search", "args": {"query": "weather today"}}]
+    seed: int = 0
+
+    _state: dict = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: Any):
+        self._state.update({"lock": threading.Lock(), "random": random.Random(self.seed), "reviews": {}, "calls": 0, "ids": itertools.count(1)})
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    @property
+    def calls(self) -> int:
+        return self._state["calls"]
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(tools=list(tools), tool_choice=tool_choice, **kwargs)
+
+    def _next_latency_and_failure(self):
+        with self._state["lock"]:
+            self._state["calls"] += 1
+            generator = self._state["random"]
+            latency = self.latency + generator.uniform(0, self.latency_jitter) if self.latency_jitter else self.latency
+            failed = self.failure_rate > 0 and generator.random() < self.failure_rate
+            if self.slow_rate > 0 and generator.random() < self.slow_rate:
+                latency += self.slow_latency
+
+        return latency, failed
+
+    def _malformed(self) -> bool:
+        with self._state["lock"]:
+            return self.malformed_rate > 0 and self._state["random"].random() < self.malformed_rate
+
+    def _next_id(self) -> str:
+        with self._state["lock"]:
+            return f"call_{next(self._state['ids'])}"
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, **kwargs) -> ChatResult:
+        latency, failed = self._next_latency_and_failure()
+        if latency:
+            time.sleep(latency)
+        if failed:
+            raise RuntimeError("FakeChatModel simulated failure")
+
+        return self._result(messages, tools, tool_choice)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, **kwargs) -> ChatResult:
+        latency, failed = self._next_latency_and_failure()
+        if latency:
+            await asyncio.sleep(latency)
+        if failed:
+            raise RuntimeError("FakeChatModel simulated failure")
+
+        return self._result(messages, tools, tool_choice)
+
+    def _result(self, messages, tools, tool_choice) -> ChatResult:
+        if tools and tool_choice:
+            # with_structured_output binds the schema as the only tool and forces it
+            schema = tools[0]
+            args = self._structured_response(schema, messages).model_dump()
+            if self._malformed():
+                # a reply missing its first field fails validation, like a CodeReview without a SCORE
+                args.pop(next(iter(args)), None)
+            message = AIMessage(content="", tool_calls=[{"name": convert_to_openai_tool(schema)["function"]["name"], "args": args, "id": self._next_id()}])
+        elif tools and not isinstance(messages[-1], ToolMessage):
+            names = {convert_to_openai_tool(tool)["function"]["name"] for tool in tools}
+            tool_calls = [{"name": call["name"], "args": call["args"], "id": self._next_id()} for call in self.research_tool_calls if call["name"] in names]
+            message = AIMessage(content="" if tool_calls else "No tools were needed.", tool_calls=tool_calls)
+        else:
+            message = AIMessage(content=f"Summary of {len(messages)} messages from the fake model.")
+
+        message.usage_metadata = {"input_tokens": estimate_tokens(messages), "output_tokens": estimate_tokens([message.content + str(message.tool_calls)]), "total_tokens": 0}
+        message.usage_metadata["total_tokens"] = message.usage_metadata["input_tokens"] + message.usage_metadata["output_tokens"]
+
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _structured_response(self, schema, messages) -> BaseModel:
+        system_message = messages[0].content if messages else ""
+
+        if schema is APIDefinition:
+            methods = ["POST", "GET", "PUT", "DELETE"]
+            endpoints = [APIEndpoint(NAME=f"Endpoint{i}", PATH=f"/items{i % max(1, self.tables)}/{{id}}", DESCRIPTION=f"Operation {i} on items{i % max(1, self.tables)}",
+                                     METHOD=methods[i % len(methods)], REQUEST=f"id, field{i}", RESPONSE=f"items{i % max(1, self.tables)} record")
+                         for i in range(self.endpoints)]
+            return APIDefinition(API_NAME="FakeAPI", DESCRIPTION="API generated by the fake model", ENDPOINTS=endpoints, DATA_STORAGE="DynamoDB")
+
+        if schema is DynamoTables:
+            tables = [DynamoTable(TABLE_NAME=f"items{i}", DESCRIPTION=f"Table {i}", PRIMARY_KEY="id", SORT_KEY="created_at",
+                                  INDEXES=[DynamoIndex(INDEX_NAME=f"items{i}_by_owner", DESCRIPTION="Lookup by owner", KEYS="owner")],
+                                  ATTRIBUTES=[DynamoAttribute(ATTRIBUTE_NAME=name, DESCRIPTION=name, TYPE="S") for name in ("id", "created_at", "owner")])
+                      for i in range(self.tables)]
+            return DynamoTables(TABLES=tables)
+
+        if schema is CodeFile:
+            if "Terraform" in system_message:
+                return CodeFile(FILENAME="main.tf", RAW_CODE='resource "aws_dynamodb_table" "items" {\n  name         = "items"\n  billing_mode = "PAY_PER_REQUEST"\n  hash_key     = "id"\n\n  attribute {\n    name = "id"\n    type = "S"\n  }\n}\n')
+
+            name = re.search(r"Function Name:\s*(\S+)", system_message)
+            filename = re.sub(r"[^a-z0-9_]", "_", name.group(1).lower()) if name else "handler"
+            return CodeFile(FILENAME=f"{filename}.py", RAW_CODE="import json\nimport logging\nimport os\n\nimport boto3\n\nlogger = logging.getLogger()\n\n\ndef lambda_handler(event, context):\n    table = boto3.resource('dynamodb').Table(os.environ['TABLE_NAME'])\n    logger.info('handling %s', event)\n    return {'statusCode': 200, 'body': json.dumps({'table': table.name})}\n")
+
+        if schema is CodeReview:
+            # every artifact walks through score_sequence, the code under review is not part of the key
+            artifact = system_message.split("\nCurrent ")[0]
+            with self._state["lock"]:
+                index = self._state["reviews"].get(artifact, 0)
+                self._state["reviews"][artifact] = index + 1
+            return CodeReview(REVIEW=f"Review {index + 1} from the fake model", SCORE=self.score_sequence[min(index, len(self.score_sequence) - 1)])
+
+        if schema is ResearchPlan:
+            # one sub-question per sentence of the goal
+            goal = system_message.split("Research goal:")[-1]
+            return ResearchPlan(SUB_QUESTIONS=[sentence.strip() for sentence in re.split(r"(?<=[.?!])\s+", goal.strip()) if sentence.strip()])
+
+        return sample_instance(schema)
+
+
+def sample_instance(schema: type[BaseModel]) -> BaseModel:
+    # fills every field of an arbitrary pydantic model with a placeholder value
+    return schema(**{name: _sample_value(field.annotation, name) for name, field in schema.model_fields.items()})
+
+
+def _sample_value(annotation, name: str):
+    origin = typing.get_origin(annotation)
+    if origin in (list, typing.List):
+        (item,) = typing.get_args(annotation) or (str,)
+        return [_sample_value(item, name)]
+    if origin in (typing.Union, types.UnionType):
+        return _sample_value(next(arg for arg in typing.get_args(annotation) if arg is not type(None)), name)
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return sample_instance(annotation)
+    if annotation is int:
+        return 1
+    if annotation is float:
+        return 1.0
+    if annotation is bool:
+        return True
+    if origin is dict:
+        return {}
+
+    return f"{name} from the fake model"
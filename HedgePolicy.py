@@ -0,0 +1,49 @@
+import threading
+from collections import deque
+
+class HedgePolicy:
+    """
+    When to send a duplicate of a slow LLM call.
+
+    The hedge delay is the `quantile` of the agent's recent successful call latencies, so only
+    the slowest few percent of calls get a duplicate and whichever valid reply comes back first
+    is used.  No call is hedged until `min_samples` latencies are known, and duplicates are
+    capped at `max_ratio` of the completed calls so a deployment that is slow across the board
+    is not sent twice the traffic.
+    """
+
+    def __init__(self, quantile: float = 0.95, window: int = 200, min_samples: int = 20, min_delay_seconds: float = 0.5, max_ratio: float = 0.1):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay_seconds = min_delay_seconds
+        self.max_ratio = max_ratio
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._calls = 0
+        self._hedges = 0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+            self._calls += 1
+
+    def delay(self) -> float:
+        # seconds to wait for a reply before hedging, None while there are too few samples
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+
+        return max(self.min_delay_seconds, ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))])
+
+    def try_hedge(self) -> bool:
+        with self._lock:
+            if self._hedges + 1 > self.max_ratio * max(1, self._calls):
+                return False
+            self._hedges += 1
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self._calls, "hedges": self._hedges, "samples": len(self._latencies)}
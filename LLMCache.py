@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pydantic import BaseModel
+
+class LLMCache:
+    """
+    Opt-in on-disk cache of structured LLM replies.
+
+    Entries are content addressed: the key is a hash of the model identity, the formatted
+    system and human messages and the JSON schema of the return type, so a cached reply is
+    only reused when the exact same request would be sent again.  The validated pydantic
+    object is stored as JSON.  Entries older than max_age_seconds are ignored and purged,
+    and the least recently used entries are evicted once max_entries is exceeded.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, max_age_seconds: float = 7 * 24 * 60 * 60):
+        self._path = path
+        self._max_entries = max_entries
+        self._max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        # create the folder for the database if it does not exist
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                return_type TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed_at ON llm_cache (accessed_at)")
+        self._connection.commit()
+
+    @staticmethod
+    def model_identity(model) -> str:
+        # the deployment and model name decide which weights answer the request
+        parts = [getattr(model, "_llm_type", type(model).__name__)]
+        for attribute in ("deployment_name", "model_name", "model", "temperature"):
+            value = getattr(model, attribute, None)
+            if value is not None and isinstance(value, (str, int, float)):
+                parts.append(f"{attribute}={value}")
+
+        return "|".join(parts)
+
+    @staticmethod
+    def make_key(model_identity: str, system_message: str, human_message: str, return_schema: dict) -> str:
+        payload = json.dumps({
+            "model": model_identity,
+            "system": system_message,
+            "human": human_message,
+            "schema": return_schema,
+        }, sort_keys=True)
+
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, return_type: type[BaseModel]):
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+
+            if row is None or now - row[1] > self._max_age_seconds:
+                self.misses += 1
+                return None
+
+            self._connection.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+
+        return return_type.model_validate_json(row[0])
+
+    def put(self, key: str, response: BaseModel):
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, return_type, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, type(response).__name__, response.model_dump_json(), now, now))
+            self._evict(now)
+            self._connection.commit()
+
+    async def aget(self, key: str, return_type: type[BaseModel]):
+        # the sqlite lookup and its lock run on a thread so cached calls do not block the event loop
+        return await asyncio.to_thread(self.get, key, return_type)
+
+    async def aput(self, key: str, response: BaseModel):
+        await asyncio.to_thread(self.put, key, response)
+
+    def _evict(self, now: float):
+        # drop everything that is too old, then the least recently used entries over the limit
+        self._connection.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self._max_age_seconds,))
+        self._connection.execute("""
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )""", (self._max_entries,))
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM llm_cache")
+            self._connection.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0, "entries": entries}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
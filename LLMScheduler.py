@@ -0,0 +1,349 @@
+import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import random
+import threading
+import time
+
+# lower values are scheduled first
+PRIORITY_ARCHITECT = 0
+PRIORITY_WRITER = 1
+PRIORITY_REVIEWER = 2
+
+PRIORITY_NAMES = {PRIORITY_ARCHITECT: "architect", PRIORITY_WRITER: "writer", PRIORITY_REVIEWER: "reviewer"}
+
+
+def content_characters(message) -> int:
+    # list content (content blocks) is counted as its string form, not as the number of blocks
+    content = message.content if hasattr(message, "content") else message
+    return len(content if isinstance(content, str) else str(content))
+
+
+def estimate_tokens(messages) -> int:
+    # rough estimate, about four characters per token for English text and code
+    characters = sum(content_characters(message) for message in messages)
+    return max(1, characters // 4)
+
+
+def is_throttling_error(error: Exception) -> bool:
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        response = getattr(error, "response", None)
+        status_code = getattr(response, "status_code", None)
+
+    return status_code == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after_seconds(error: Exception):
+    # honour the Retry-After header the service sends with a 429 when there is one
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# threads for the synchronous model calls that have a deadline
+_deadline_threads = None
+
+
+def deadline_threads() -> concurrent.futures.ThreadPoolExecutor:
+    global _deadline_threads
+    if _deadline_threads is None:
+        _deadline_threads = concurrent.futures.ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-deadline")
+
+    return _deadline_threads
+
+
+def invoke_within(runnable, messages: list, timeout: float = None, on_late=None):
+    # threads cannot be cancelled, a call that misses its deadline finishes in the background and on_late gets its future
+    if timeout is None:
+        return runnable.invoke(messages)
+
+    call = deadline_threads().submit(runnable.invoke, messages)
+    done, _ = concurrent.futures.wait({call}, timeout=timeout)
+    if not done:
+        if on_late is not None:
+            on_late(call)
+        raise TimeoutError(f"no reply within {timeout}s")
+
+    return call.result()
+
+
+async def ainvoke_within(runnable, messages: list, timeout: float = None):
+    if timeout is None:
+        return await runnable.ainvoke(messages)
+
+    return await asyncio.wait_for(runnable.ainvoke(messages), timeout)
+
+
+class TokenBucket:
+    def __init__(self, capacity_per_minute: float):
+        self.capacity = float(capacity_per_minute)
+        self._rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        # a request larger than the whole bucket is let through once the bucket is full
+        amount = min(amount, self.capacity)
+        self._refill(now)
+        if self._tokens >= amount:
+            return 0.0
+
+        return (amount - self._tokens) / self._rate
+
+    def consume(self, amount: float, now: float):
+        self._refill(now)
+        self._tokens -= min(amount, self.capacity)
+
+
+class _Waiter:
+    def __init__(self, priority: int, sequence: int, tokens: int, loop: asyncio.AbstractEventLoop = None):
+        self.priority = priority
+        self.sequence = sequence
+        self.tokens = tokens
+        self.granted = False
+        self.delay = None
+        self._loop = loop
+        self._event = asyncio.Event() if loop is not None else threading.Event()
+
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+    def wake(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._event.set)
+        else:
+            self._event.set()
+
+    def wait(self, timeout):
+        self._event.wait(timeout)
+        self._event.clear()
+
+    async def await_wake(self, timeout):
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._event.clear()
+
+
+class LLMScheduler:
+    """
+    Shared gate in front of the chat model.
+
+    Every StructuredAgent call waits here until a concurrency slot is free and the
+    requests-per-minute and tokens-per-minute token buckets can cover it.  Waiting calls
+    are released in priority order (architects, then writers, then reviewers) and in
+    arrival order within a priority.  Throttled calls back off, pause the whole queue and
+    are retried.  Queue wait and model latency are tracked separately, and a call's deadline
+only runs while it holds its slot, so time spent queued never counts against it.
+    """
+
+    def __init__(self, requests_per_minute: int = None, tokens_per_minute: int = None, max_concurrency: int = None,
+                 max_retries: int = 5, base_backoff_seconds: float = 1.0, max_backoff_seconds: float = 60.0,
+                 expected_completion_tokens: int = 1000):
+        self._request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._max_concurrency = max_concurrency
+        self._max_retries = max_retries
+        self._base_backoff_seconds = base_backoff_seconds
+        self._max_backoff_seconds = max_backoff_seconds
+        self._expected_completion_tokens = expected_completion_tokens
+
+        self._lock = threading.Lock()
+        self._queue: list[_Waiter] = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._paused_until = 0.0
+        self._stats = {}
+
+    def _record(self, priority: int, **values):
+        with self._lock:
+            stats = self._stats.setdefault(PRIORITY_NAMES.get(priority, str(priority)), {
+                "calls": 0, "retries": 0, "throttled": 0, "failures": 0,
+                "queue_wait_seconds": 0.0, "max_queue_wait_seconds": 0.0,
+                "model_latency_seconds": 0.0, "max_model_latency_seconds": 0.0})
+            for name, value in values.items():
+                stats[name] += value
+            stats["max_queue_wait_seconds"] = max(stats["max_queue_wait_seconds"], values.get("queue_wait_seconds", 0.0))
+            stats["max_model_latency_seconds"] = max(stats["max_model_latency_seconds"], values.get("model_latency_seconds", 0.0))
+
+    def _dispatch(self):
+        # grant queued calls in priority order, a call that has to wait for the buckets to refill
+        # sits at the head of the queue and polls again after the computed delay
+        now = time.monotonic()
+        while self._queue:
+            if self._max_concurrency is not None and self._active >= self._max_concurrency:
+                return
+
+            waiter = self._queue[0]
+            delay = self._paused_until - now
+            if self._request_bucket is not None:
+                delay = max(delay, self._request_bucket.wait_time(1, now))
+            if self._token_bucket is not None:
+                delay = max(delay, self._token_bucket.wait_time(waiter.tokens, now))
+            if delay > 0:
+                if waiter.delay is None:
+                    waiter.wake()
+                waiter.delay = delay
+                return
+
+            heapq.heappop(self._queue)
+            if self._request_bucket is not None:
+                self._request_bucket.consume(1, now)
+            if self._token_bucket is not None:
+                self._token_bucket.consume(waiter.tokens, now)
+            self._active += 1
+            waiter.granted = True
+            waiter.wake()
+
+    def _enqueue(self, priority: int, tokens: int, loop=None) -> _Waiter:
+        waiter = _Waiter(priority, next(self._sequence), tokens, loop)
+        with self._lock:
+            heapq.heappush(self._queue, waiter)
+            self._dispatch()
+
+        return waiter
+
+    def _poll(self, waiter: _Waiter):
+        with self._lock:
+            if not waiter.granted:
+                self._dispatch()
+
+    def _abandon(self, waiter: _Waiter):
+        # a call cancelled while queued (a hedged duplicate that lost, or a missed deadline) gives back its place or its slot
+        with self._lock:
+            if waiter.granted:
+                self._active -= 1
+            elif waiter in self._queue:
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+            self._dispatch()
+
+    def _release(self):
+        with self._lock:
+            self._active -= 1
+            self._dispatch()
+
+    def _throttled(self, error: Exception, attempt: int) -> float:
+        delay = retry_after_seconds(error)
+        if delay is None:
+            delay = min(self._max_backoff_seconds, self._base_backoff_seconds * (2 ** attempt))
+            delay = delay / 2 + random.uniform(0, delay / 2)
+
+        # hold back every queued call, not just this one, so the service can recover
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+        return delay
+
+    def _tokens_for(self, messages) -> int:
+        return estimate_tokens(messages) + self._expected_completion_tokens
+
+    async def acquire(self, priority: int, tokens: int) -> float:
+        started_at = time.monotonic()
+        waiter = self._enqueue(priority, tokens, asyncio.get_running_loop())
+        try:
+            while not waiter.granted:
+                await waiter.await_wake(waiter.delay)
+                self._poll(waiter)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+        return time.monotonic() - started_at
+
+    def acquire_sync(self, priority: int, tokens: int) -> float:
+        started_at = time.monotonic()
+        waiter = self._enqueue(priority, tokens)
+        while not waiter.granted:
+            waiter.wait(waiter.delay)
+            self._poll(waiter)
+
+        return time.monotonic() - started_at
+
+    async def arun(self, runnable, messages: list, priority: int = PRIORITY_WRITER, call_stats: dict = None,
+                   timeout: float = None, on_start=None):
+        # call_stats, when given, collects this call's total queue wait, retry count and model latency for telemetry,
+        # timeout bounds each model call from the moment it is granted a slot, and on_start is called at every grant
+        call_stats = call_stats if call_stats is not None else {}
+        call_stats.update(queue_wait_seconds=0.0, retries=0)
+        tokens = self._tokens_for(messages)
+        for attempt in range(self._max_retries + 1):
+            queue_wait = await self.acquire(priority, tokens)
+            call_stats["queue_wait_seconds"] += queue_wait
+            if on_start is not None:
+                on_start()
+            started_at = time.monotonic()
+            try:
+                response = await ainvoke_within(runnable, messages, timeout)
+                call_stats["model_latency_seconds"] = time.monotonic() - started_at
+                self._record(priority, calls=1, queue_wait_seconds=queue_wait, model_latency_seconds=call_stats["model_latency_seconds"])
+                return response
+            except Exception as e:
+                self._record(priority, queue_wait_seconds=queue_wait, model_latency_seconds=time.monotonic() - started_at)
+                if not is_throttling_error(e) or attempt == self._max_retries:
+                    self._record(priority, failures=1)
+                    raise
+                delay = self._throttled(e, attempt)
+                self._record(priority, retries=1, throttled=1)
+                call_stats["retries"] += 1
+            finally:
+                self._release()
+
+            await asyncio.sleep(delay)
+
+    def run(self, runnable, messages: list, priority: int = PRIORITY_WRITER, call_stats: dict = None,
+            timeout: float = None, on_start=None):
+        # call_stats, when given, collects this call's total queue wait, retry count and model latency for telemetry,
+        # timeout bounds each model call from the moment it is granted a slot, and on_start is called at every grant
+        call_stats = call_stats if call_stats is not None else {}
+        call_stats.update(queue_wait_seconds=0.0, retries=0)
+        tokens = self._tokens_for(messages)
+        for attempt in range(self._max_retries + 1):
+            queue_wait = self.acquire_sync(priority, tokens)
+            call_stats["queue_wait_seconds"] += queue_wait
+            if on_start is not None:
+                on_start()
+            started_at = time.monotonic()
+            late_calls = []
+            try:
+                response = invoke_within(runnable, messages, timeout, late_calls.append)
+                call_stats["model_latency_seconds"] = time.monotonic() - started_at
+                self._record(priority, calls=1, queue_wait_seconds=queue_wait, model_latency_seconds=call_stats["model_latency_seconds"])
+                return response
+            except Exception as e:
+                self._record(priority, queue_wait_seconds=queue_wait, model_latency_seconds=time.monotonic() - started_at)
+                if not is_throttling_error(e) or attempt == self._max_retries:
+                    self._record(priority, failures=1)
+                    raise
+                delay = self._throttled(e, attempt)
+                self._record(priority, retries=1, throttled=1)
+                call_stats["retries"] += 1
+            finally:
+                if late_calls:
+                    # a call that missed its deadline still occupies the deployment, its slot is given back once it finishes
+                    late_calls[0].add_done_callback(lambda _: self._release())
+                else:
+                    self._release()
+
+            time.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._lock:
+            report = {name: dict(values) for name, values in self._stats.items()}
+
+        for values in report.values():
+            attempts = values["calls"] + values["failures"] + values["retries"]
+            values["mean_queue_wait_seconds"] = values["queue_wait_seconds"] / attempts if attempts else 0.0
+            values["mean_model_latency_seconds"] = values["model_latency_seconds"] / attempts if attempts else 0.0
+
+        return report
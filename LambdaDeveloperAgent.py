@@ -1,8 +1,12 @@
 from CodeBaseModels import CodeFile, CodeReview
 from StructuredAgent import StructuredAgent
+from CodeValidators import LambdaValidator
+from ReviewLoop import ReviewLoop
+from CallBudget import CallBudget
+from LLMScheduler import PRIORITY_WRITER, PRIORITY_REVIEWER
 
 class LambdaDeveloperAgent:
-    def __init__(self, model):
+    def __init__(self, model, validators: list = None, candidates: int = 1, **agent_options):
         writer_system_message_template = """
 You are an expert at writing AWS Lambda functions that will be used to implement the business
 logic of an AWS API Gateway endpoint.
@@ -98,24 +102,21 @@ Current Code:
 
 {code}
 """
-        self._writer_agent = StructuredAgent(model, writer_system_message_template, CodeFile)
-        self._reviewer_agent = StructuredAgent(model, reviewer_system_message_template, CodeReview)
-
-    def write_lambda(self, function_name, description, request, response, schema, min_quality_score: int = 8, max_review_iterations: int = 3) -> CodeFile:
-        review = ""
-        code = ""
-        review_score = 0
-        review_count = 0
-
-        while (review_score < min_quality_score and review_count < max_review_iterations):
-            lambda_function: CodeFile = self._writer_agent.reply("Create or improve the Lambda Function", {"name": function_name, "description": description, "request": request, "response": response, "schema": schema, "code": code, "review": review})
-
-            code = lambda_function.RAW_CODE
-            
-            if lambda_function:
-                lambda_review: CodeReview = self._reviewer_agent.reply("Review the Lambda Function", {"name": function_name, "description": description, "request": request, "response": response, "schema": schema, "code": code})
-                review = lambda_review.REVIEW
-                review_score = lambda_review.SCORE
-                review_count += 1
-
-        return lambda_function
\ No newline at end of file
+        self._writer_agent = StructuredAgent(model, writer_system_message_template, CodeFile, priority=PRIORITY_WRITER, name="lambda_writer", **agent_options)
+        self._reviewer_agent = StructuredAgent(model, reviewer_system_message_template, CodeReview, priority=PRIORITY_REVIEWER, name="lambda_reviewer", **agent_options)
+
+        # local checks that run before a draft is sent to the reviewer
+        validators = validators if validators is not None else [LambdaValidator()]
+
+        self._review_loop = ReviewLoop(self._writer_agent, self._reviewer_agent, "Create or improve the Lambda Function", "Review the Lambda Function", validators, reviewer_code_key="code", candidates=candidates,
+                                       name="lambda", telemetry=agent_options.get("telemetry"), router=agent_options.get("router"))
+
+    def write_lambda(self, function_name, description, request, response, schema, min_quality_score: int = 8, max_review_iterations: int = 3, budget: CallBudget = None, artifact: str = None,
+                     simple: bool = False) -> CodeFile:
+        context = {"name": function_name, "description": description, "request": request, "response": response, "schema": schema}
+        return self._review_loop.run(context, min_quality_score, max_review_iterations, budget, artifact or function_name, simple)
+
+    async def awrite_lambda(self, function_name, description, request, response, schema, min_quality_score: int = 8, max_review_iterations: int = 3, budget: CallBudget = None, artifact: str = None,
+                            simple: bool = False) -> CodeFile:
+        context = {"name": function_name, "description": description, "request": request, "response": response, "schema": schema}
+        return await self._review_loop.arun(context, min_quality_score, max_review_iterations, budget, artifact or function_name, simple)
\ No newline at end of file
@@ -0,0 +1,51 @@
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from LLMScheduler import content_characters, estimate_tokens
+
+# Keeps the research loop's prompt under a token budget.  Tool results pile up in the conversation
+# and are re-sent on every turn, so once the prompt is over budget the older ones are cut down,
+# oldest first, to what fits.  Messages are never dropped (every tool call keeps its result) and
+# the latest round, the last tool calling AI message and everything after it, is sent as is.
+
+CHARACTERS_PER_TOKEN = 4
+
+
+def latest_round_start(messages: list[BaseMessage]) -> int:
+    for position in range(len(messages) - 1, -1, -1):
+        message = messages[position]
+        if isinstance(message, AIMessage) and message.tool_calls:
+            return position
+
+    return len(messages)
+
+
+def truncate_content(message: ToolMessage, keep_characters: int) -> ToolMessage:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    removed = len(content) - keep_characters
+    note = f"\n[... {removed} characters of this {message.name or 'tool'} result were removed to keep the prompt short]"
+    return message.model_copy(update={"content": content[:keep_characters] + note})
+
+
+def compact_messages(messages: list[BaseMessage], max_tokens: int, min_characters: int = 300) -> list[BaseMessage]:
+    # returns the messages to send, the graph state keeps the full tool results
+    tokens = estimate_tokens(messages)
+    if not max_tokens or tokens <= max_tokens:
+        return messages
+
+    compacted = list(messages)
+    for position in range(latest_round_start(messages)):
+        message = messages[position]
+        if not isinstance(message, ToolMessage):
+            continue
+
+        length = content_characters(message)
+        excess_characters = (tokens - max_tokens) * CHARACTERS_PER_TOKEN
+        keep_characters = max(min_characters, length - excess_characters)
+        if keep_characters >= length:
+            continue
+
+        compacted[position] = truncate_content(message, keep_characters)
+        tokens -= (length - len(compacted[position].content)) // CHARACTERS_PER_TOKEN
+        if tokens <= max_tokens:
+            break
+
+    return compacted
@@ -0,0 +1,48 @@
+from Telemetry import Telemetry
+
+TIER_SMALL = "small"
+TIER_LARGE = "large"
+
+# methods of a plain create / read / update / delete endpoint
+CRUD_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE"}
+
+
+def is_simple_endpoint(method: str, table_count: int) -> bool:
+    # a CRUD endpoint over a single table is left to the small model for its first draft
+    return method.strip().upper() in CRUD_METHODS and table_count == 1
+
+
+class ModelRouter:
+    """
+    Picks the model tier for each writer and reviewer call of a ReviewLoop.
+
+    Reviews always go to the small tier.  A first draft goes to the small tier when the artifact
+    is simple (see is_simple_endpoint) and to the large tier otherwise.  When the best score is
+    still below min_quality_score after a round the artifact is escalated and every later draft
+    goes to the large tier.  Each decision is recorded in Telemetry, StructuredAgent records the
+    latency and tokens of every call against the tier that answered it.
+    """
+
+    def __init__(self, small_model, large_model, telemetry: Telemetry = None):
+        self.models = {TIER_SMALL: small_model, TIER_LARGE: large_model}
+        self._telemetry = telemetry
+
+    def writer_tier(self, loop: str, artifact: str, round_index: int, best_score: int, min_quality_score: int, simple: bool) -> str:
+        # the best score never drops and the loop stops once it reaches the bar, so an escalated artifact stays on the large tier
+        if round_index > 0 and best_score < min_quality_score:
+            tier, reason = TIER_LARGE, "below_quality"
+        elif simple:
+            tier, reason = TIER_SMALL, "simple"
+        else:
+            tier, reason = TIER_LARGE, "complex"
+
+        self._record(loop, artifact, round_index, "writer", tier, reason)
+        return tier
+
+    def reviewer_tier(self, loop: str, artifact: str, round_index: int) -> str:
+        self._record(loop, artifact, round_index, "reviewer", TIER_SMALL, "review")
+        return TIER_SMALL
+
+    def _record(self, loop: str, artifact: str, round_index: int, role: str, tier: str, reason: str):
+        if self._telemetry is not None:
+            self._telemetry.record_route(loop, artifact, round_index, role, tier, reason)
@@ -0,0 +1,102 @@
+import json
+import os
+from APIArchitectAgent import APIDefinition, APIEndpoint
+from DynamoDBArchitectAgent import DynamoTables
+from CodeBaseModels import CodeFile
+from SchemaIndex import build_schema_index, schema_slice
+
+# The output folder of an earlier dev team run, loaded for an incremental run.  The new design is
+# diffed against the old one endpoint by endpoint and table by table, and a lambda or terraform
+# script is only written again when what it is generated from changed, otherwise the earlier
+# file is reused.  manifest.json maps each endpoint to the lambda file written for it.
+
+MANIFEST = "manifest.json"
+
+
+def write_manifest(writer, state: dict):
+    writer.write_json(MANIFEST, {"lambdas": state.get("LambdaFiles", {})})
+
+
+def _read(folder: str, filename: str) -> str:
+    path = os.path.join(folder, filename)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+class PreviousRun:
+    def __init__(self, folder: str, api_definition: APIDefinition, database_architecture: DynamoTables = None, lambda_files: dict[str, str] = None):
+        self.folder = folder
+        self.api_definition = api_definition
+        self.database_architecture = database_architecture
+        self.lambda_files = lambda_files or {}
+        self._endpoints = {endpoint.NAME: endpoint for endpoint in api_definition.ENDPOINTS}
+        self._tables = [table.model_dump_json() for table in database_architecture.TABLES] if database_architecture is not None else None
+        self._schemas = None
+
+    @classmethod
+    def load(cls, folder: str) -> "PreviousRun":
+        api_definition = _read(folder, "api_definition.json")
+        if api_definition is None:
+            raise ValueError(f"{folder} has no api_definition.json, it is not the output folder of a dev team run")
+
+        database_architecture = _read(folder, "database_schema.json")
+        # runs from before the manifest existed still reuse their terraform scripts, only the lambdas are all written again
+        manifest = json.loads(_read(folder, MANIFEST) or "{}")
+
+        return cls(folder, APIDefinition.model_validate_json(api_definition),
+                   DynamoTables.model_validate_json(database_architecture) if database_architecture is not None else None,
+                   manifest.get("lambdas", {}))
+
+    def _code_file(self, filename: str) -> CodeFile:
+        raw_code = _read(self.folder, filename)
+        return CodeFile(FILENAME=filename, RAW_CODE=raw_code) if raw_code is not None else None
+
+    def _schema(self, name: str) -> str:
+        # the schema slice the earlier run's lambda developer was given, worked out the same way as send_to_developer
+        if self._schemas is None:
+            schema_index = build_schema_index(self.api_definition.ENDPOINTS, self.database_architecture.TABLES)
+            self._schemas = {endpoint: str(schema_slice(self._tables, positions)) for endpoint, positions in schema_index.items()}
+
+        return self._schemas.get(name)
+
+    def lambda_function(self, endpoint: APIEndpoint, database_schema: str) -> CodeFile:
+        # the earlier lambda when neither the endpoint nor the tables it uses changed, else None
+        previous = self._endpoints.get(endpoint.NAME)
+        if previous is None or previous != endpoint or self._tables is None or endpoint.NAME not in self.lambda_files:
+            return None
+        if self._schema(endpoint.NAME) != database_schema:
+            return None
+
+        return self._code_file(self.lambda_files[endpoint.NAME])
+
+    def database_terraform(self, table_list: list[str]) -> CodeFile:
+        if self._tables is None or self._tables != table_list:
+            return None
+
+        return self._code_file("Database.tf")
+
+    def api_gateway_terraform(self, endpoint_list: list[str]) -> CodeFile:
+        if [endpoint.model_dump_json() for endpoint in self.api_definition.ENDPOINTS] != endpoint_list:
+            return None
+
+        return self._code_file("APIGateway.tf")
+
+    def diff(self, api_definition: APIDefinition, database_architecture: DynamoTables = None) -> dict:
+        # endpoint and table names by what happened to them since the earlier run
+        def compare(previous: dict, current: dict) -> dict:
+            return {
+                "added": [name for name in current if name not in previous],
+                "changed": [name for name in current if name in previous and previous[name] != current[name]],
+                "unchanged": [name for name in current if name in previous and previous[name] == current[name]],
+                "removed": [name for name in previous if name not in current],
+            }
+
+        result = {"endpoints": compare(self._endpoints, {endpoint.NAME: endpoint for endpoint in api_definition.ENDPOINTS})}
+        if database_architecture is not None:
+            previous_tables = {table.TABLE_NAME: table for table in self.database_architecture.TABLES} if self.database_architecture is not None else {}
+            result["tables"] = compare(previous_tables, {table.TABLE_NAME: table for table in database_architecture.TABLES})
+
+        return result
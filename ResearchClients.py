@@ -0,0 +1,251 @@
+import asyncio
+import os
+import threading
+import weakref
+
+# Long-lived clients behind the research tools.  Each holds one pooled, keep-alive HTTP client for
+# the whole process (and one async client per event loop, an httpx.AsyncClient cannot move between
+# loops), created on first use so importing research_agent stays free of network setup.
+
+USER_AGENT = "dev-team-research-agent/1.0 (python-httpx)"
+
+
+class PooledHTTPClient:
+    def __init__(self, max_connections: int = 10, timeout: float = 30.0):
+        self._max_connections = max_connections
+        self._timeout = timeout
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _limits(self):
+        import httpx
+
+        return httpx.Limits(max_connections=self._max_connections, max_keepalive_connections=self._max_connections)
+
+    @property
+    def client(self):
+        import httpx
+
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(limits=self._limits(), timeout=self._timeout, headers={"User-Agent": USER_AGENT})
+            return self._client
+
+    @property
+    def async_client(self):
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._async_clients[loop] = httpx.AsyncClient(limits=self._limits(), timeout=self._timeout, headers={"User-Agent": USER_AGENT})
+            return client
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self):
+        # closes the running loop's async client
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+class WebSearchClient(PooledHTTPClient):
+    # Tavily search, the same request and result shape as langchain_community's TavilySearchResults
+    url = "https://api.tavily.com/search"
+
+    def __init__(self, max_results: int = 5, search_depth: str = "advanced", **kwargs):
+        super().__init__(**kwargs)
+        self.max_results = max_results
+        self.search_depth = search_depth
+
+    def _params(self, query: str) -> dict:
+        return {
+            "api_key": os.environ["TAVILY_API_KEY"],
+            "query": query,
+            "max_results": self.max_results,
+            "search_depth": self.search_depth,
+            "include_answer": False,
+            "include_raw_content": False,
+            "include_images": False,
+        }
+
+    @staticmethod
+    def _clean(response: dict) -> list[dict]:
+        return [{"title": result["title"], "url": result["url"], "content": result["content"], "score": result["score"]}
+                for result in response.get("results", [])]
+
+    def search(self, query: str) -> list[dict]:
+        response = self.client.post(self.url, json=self._params(query))
+        response.raise_for_status()
+        return self._clean(response.json())
+
+    async def asearch(self, query: str) -> list[dict]:
+        response = await self.async_client.post(self.url, json=self._params(query))
+        response.raise_for_status()
+        return self._clean(response.json())
+
+
+class WikipediaClient(PooledHTTPClient):
+    # page summaries from the MediaWiki API, formatted like langchain_community's WikipediaQueryRun.
+    # The intros of all the found pages come back in one request instead of one per page
+    no_result = "No good Wikipedia Search Result was found"
+
+    def __init__(self, lang: str = "en", top_k_results: int = 3, max_query_length: int = 300, doc_content_chars_max: int = 4000, **kwargs):
+        super().__init__(**kwargs)
+        self.url = f"https://{lang}.wikipedia.org/w/api.php"
+        self.top_k_results = top_k_results
+        self.max_query_length = max_query_length
+        self.doc_content_chars_max = doc_content_chars_max
+
+    def _search_params(self, query: str) -> dict:
+        return {"action": "query", "list": "search", "srsearch": query[:self.max_query_length], "srlimit": self.top_k_results, "format": "json"}
+
+    @staticmethod
+    def _extract_params(titles: list[str]) -> dict:
+        return {"action": "query", "prop": "extracts", "exintro": 1, "explaintext": 1, "redirects": 1, "titles": "|".join(titles), "format": "json"}
+
+    @staticmethod
+    def _titles(response: dict) -> list[str]:
+        return [result["title"] for result in response.get("query", {}).get("search", [])]
+
+    def _format(self, titles: list[str], response: dict) -> str:
+        query = response.get("query", {})
+        # redirected and normalized titles are mapped back so the pages keep the search order
+        renamed = {entry["from"]: entry["to"] for entry in query.get("normalized", []) + query.get("redirects", [])}
+        extracts = {page["title"]: page.get("extract") for page in query.get("pages", {}).values()}
+        summaries = []
+        for title in titles:
+            extract = extracts.get(renamed.get(title, title))
+            if extract:
+                summaries.append(f"Page: {title}\nSummary: {extract}")
+
+        return "\n\n".join(summaries)[:self.doc_content_chars_max] if summaries else self.no_result
+
+    def search(self, query: str) -> str:
+        response = self.client.get(self.url, params=self._search_params(query))
+        response.raise_for_status()
+        titles = self._titles(response.json())
+        if not titles:
+            return self.no_result
+
+        response = self.client.get(self.url, params=self._extract_params(titles))
+        response.raise_for_status()
+        return self._format(titles, response.json())
+
+    async def asearch(self, query: str) -> str:
+        response = await self.async_client.get(self.url, params=self._search_params(query))
+        response.raise_for_status()
+        titles = self._titles(response.json())
+        if not titles:
+            return self.no_result
+
+        response = await self.async_client.get(self.url, params=self._extract_params(titles))
+        response.raise_for_status()
+        return self._format(titles, response.json())
+
+
+# price bars above these spans are aggregated: a year of daily rows becomes ~52 weekly ones
+DAILY_MAX_DAYS = 62
+WEEKLY_MAX_DAYS = 2 * 366
+PRICE_COLUMNS = ["Open", "High", "Low", "Close"]
+CSV_HEADER = "Date,Open,High,Low,Close,Volume\n"
+
+
+def pick_interval(start, end) -> str:
+    days = (end - start).days
+    if days <= DAILY_MAX_DAYS:
+        return "daily"
+
+    return "weekly" if days <= WEEKLY_MAX_DAYS else "monthly"
+
+
+def period_labels(days, interval: str):
+    # the date each bar is labelled with: the Friday ending its week or the last day of its month.
+    # 1970-01-01, day 0, was a Thursday
+    if interval == "weekly":
+        ordinals = days.astype("int64")
+        return (ordinals + (1 - ordinals) % 7).astype("datetime64[D]")
+
+    return (days.astype("datetime64[M]") + 1).astype("datetime64[D]") - 1
+
+
+def compact_history(data, interval: str = "auto") -> dict:
+    # the price history as one CSV table (header once instead of keys on every row) with summary statistics.
+    # Everything is done on the NumPy arrays of the columns, a few hundred rows do not pay for pandas' resample and to_csv
+    import numpy
+
+    if interval == "auto":
+        interval = pick_interval(data.index[0], data.index[-1])
+
+    index = data.index.tz_localize(None) if data.index.tz is not None else data.index
+    days = index.to_numpy().astype("datetime64[D]")
+    opens, highs, lows, closes = (data[column].to_numpy(dtype="float64") for column in PRICE_COLUMNS)
+    volumes = data["Volume"].to_numpy(dtype="float64")
+
+    if interval == "daily":
+        labels, bars = days, (opens, highs, lows, closes, volumes)
+    else:
+        # rows are in date order, so every period is one run of equal labels
+        row_labels = period_labels(days, interval)
+        starts = numpy.flatnonzero(numpy.r_[True, row_labels[1:] != row_labels[:-1]])
+        ends = numpy.r_[starts[1:], len(row_labels)] - 1
+        labels = row_labels[starts]
+        bars = (opens[starts], numpy.fmax.reduceat(highs, starts), numpy.fmin.reduceat(lows, starts), closes[ends], numpy.add.reduceat(numpy.nan_to_num(volumes), starts))
+
+    rows = numpy.column_stack(bars).tolist()
+    csv = CSV_HEADER + "".join(f"{date},{o:.2f},{h:.2f},{l:.2f},{c:.2f},{v:.0f}\n" for date, (o, h, l, c, v) in zip(labels.astype(str).tolist(), rows))
+
+    first_open, last_close = float(opens[0]), float(closes[-1])
+    summary = {
+        "start": str(days[0]),
+        "end": str(days[-1]),
+        "trading_days": len(days),
+        "open": round(first_open, 2),
+        "close": round(last_close, 2),
+        "change_pct": round((last_close - first_open) / first_open * 100, 2) if first_open else None,
+        "high": round(float(numpy.nanmax(highs)), 2),
+        "low": round(float(numpy.nanmin(lows)), 2),
+        "volume_total": int(numpy.nansum(volumes)),
+        "volume_daily_mean": int(numpy.nanmean(volumes)),
+    }
+    if "Dividends" in data:
+        dividends = data["Dividends"].to_numpy(dtype="float64")
+        if dividends.any():
+            summary["dividends"] = round(float(dividends.sum()), 4)
+
+    return {"interval": interval, "summary": summary, "csv": csv}
+
+
+class StockClient:
+    # Yahoo Finance price history.  yfinance keeps its own shared session, the Ticker objects
+    # (and the metadata they load) are kept per symbol; the async variant runs in a thread
+    def __init__(self):
+        self._tickers = {}
+        self._lock = threading.Lock()
+
+    def ticker(self, symbol: str):
+        import yfinance as yf
+
+        symbol = symbol.strip().upper()
+        with self._lock:
+            if symbol not in self._tickers:
+                self._tickers[symbol] = yf.Ticker(symbol)
+            return self._tickers[symbol]
+
+    def history(self, symbol: str, start_date: str, end_date: str, interval: str = "auto") -> dict:
+        data = self.ticker(symbol).history(start=start_date, end=end_date)  # Get data for the date range
+        if data.empty:
+            raise ValueError("No data found for the provided symbol and date range.")
+
+        return {"symbol": symbol.strip().upper(), **compact_history(data, interval)}
+
+    async def ahistory(self, symbol: str, start_date: str, end_date: str, interval: str = "auto") -> dict:
+        return await asyncio.to_thread(self.history, symbol, start_date, end_date, interval)
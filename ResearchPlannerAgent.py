@@ -0,0 +1,27 @@
+from pydantic import BaseModel, Field
+from StructuredAgent import StructuredAgent
+from LLMScheduler import PRIORITY_ARCHITECT
+
+class ResearchPlan(BaseModel):
+    SUB_QUESTIONS: list[str] = Field(description="Independent, self-contained questions that together answer the research goal")
+
+class ResearchPlannerAgent:
+    def __init__(self, model, max_sub_questions: int = 4, **agent_options):
+
+        system_message_template ="""
+Today is {today}.  You plan research for an assistant that can search the web, Wikipedia and stock prices.
+Split the research goal below into at most {max_sub_questions} independent sub-questions that can be researched
+at the same time without knowing each other's answers.  Each sub-question has to make sense on its own, so repeat
+names, tickers and dates instead of referring to other sub-questions.  If the goal is a single question, return it
+unchanged as the only sub-question.
+
+Research goal:
+{goal}
+"""
+        self._max_sub_questions = max_sub_questions
+        self._agent = StructuredAgent(model, system_message_template, ResearchPlan, priority=PRIORITY_ARCHITECT, name="research_planner", **agent_options)
+
+    async def aplan(self, goal: str, today: str) -> list[str]:
+        plan = await self._agent.areply("Create the research plan", {"goal": goal, "today": today, "max_sub_questions": self._max_sub_questions})
+        questions = [question.strip() for question in plan.SUB_QUESTIONS if question.strip()]
+        return questions[:self._max_sub_questions] or [goal]
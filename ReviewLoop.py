@@ -0,0 +1,161 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from CodeBaseModels import CodeFile, CodeReview
+from CodeValidators import run_validators, format_findings
+from StructuredAgent import StructuredAgent
+from CallBudget import CallBudget
+from Telemetry import Telemetry, emit_progress
+from ModelRouter import ModelRouter
+
+class ReviewLoop:
+    """
+    Write -> review -> rewrite loop shared by the code writing agents.
+
+    Each round drafts `candidates` versions of the code at the same time, validates them
+    locally, reviews the ones that pass in parallel and continues from the round's best
+    scoring draft.  The loop stops once a draft reaches min_quality_score or after
+    max_review_iterations rounds and returns the best scoring draft seen, not just the last one.
+
+    When a CallBudget is passed it decides when to stop instead of min_quality_score and
+    max_review_iterations, and every call the loop makes is charged to `artifact`.
+
+    The writer is called with the context plus "code" and "review", the reviewer with the
+    context plus the draft under `reviewer_code_key`.
+
+    With a ModelRouter each round's drafts and reviews go to the model tier it picks, a `simple`
+    artifact starts on the small tier and moves up once a round leaves it below the quality bar.
+    """
+
+    def __init__(self, writer_agent: StructuredAgent, reviewer_agent: StructuredAgent, writer_prompt: str, reviewer_prompt: str,
+                 validators: list = None, reviewer_code_key: str = "code", candidates: int = 1, name: str = None, telemetry: Telemetry = None,
+                 router: ModelRouter = None):
+        self._writer_agent = writer_agent
+        self._reviewer_agent = reviewer_agent
+        self._writer_prompt = writer_prompt
+        self._reviewer_prompt = reviewer_prompt
+        self._validators = validators or []
+        self._reviewer_code_key = reviewer_code_key
+        self._candidates = max(1, candidates)
+        self._name = name or "review_loop"
+        self._telemetry = telemetry
+        self._router = router
+
+    def _writer_prompts(self) -> list[str]:
+        # with temperature 0 identical prompts give identical drafts, so alternatives are asked to differ
+        prompts = [self._writer_prompt]
+        for index in range(1, self._candidates):
+            prompts.append(f"{self._writer_prompt} (alternative draft {index + 1} of {self._candidates}: take a different approach where it improves the code)")
+
+        return prompts
+
+    def _check(self, draft: CodeFile):
+        # returns a failing review when the draft does not pass the local validators
+        findings = run_validators(self._validators, draft)
+        if findings:
+            return CodeReview(REVIEW=format_findings(findings), SCORE=0)
+
+        return None
+
+    def _review_data(self, context: dict, draft: CodeFile) -> dict:
+        return {**context, self._reviewer_code_key: draft.RAW_CODE}
+
+    def _tiers(self, artifact: str, review_count: int, best_review: CodeReview, min_quality_score: int, budget: CallBudget, simple: bool) -> tuple:
+        # the writer and reviewer tiers for this round, (None, None) sends both to the agents' own models
+        if self._router is None:
+            return None, None
+
+        min_quality_score = budget.min_quality_score if budget is not None else min_quality_score
+        return (self._router.writer_tier(self._name, artifact, review_count, best_review.SCORE, min_quality_score, simple),
+                self._router.reviewer_tier(self._name, artifact, review_count))
+
+    @staticmethod
+    def _keep_going(best_review: CodeReview, review_count: int, min_quality_score: int, max_review_iterations: int, budget: CallBudget, artifact: str) -> bool:
+        if budget is not None:
+            return budget.should_continue(artifact)
+
+        return best_review.SCORE < min_quality_score and review_count < max_review_iterations
+
+    def _charge(self, budget: CallBudget, artifact: str, context: dict, writer_data: dict, drafts: list[CodeFile], reviews: list[CodeReview], checks: list):
+        if budget is None:
+            return
+
+        tokens = 0
+        for prompt, draft in zip(self._writer_prompts(), drafts):
+            tokens += self._writer_agent.estimate_tokens(prompt, writer_data, draft)
+        for draft, review, check in zip(drafts, reviews, checks):
+            if check is None:
+                tokens += self._reviewer_agent.estimate_tokens(self._reviewer_prompt, self._review_data(context, draft), review)
+
+        calls = len(drafts) + checks.count(None)
+        budget.charge(artifact, calls, tokens)
+        budget.record_round(artifact, max(review.SCORE for review in reviews), calls)
+
+    def run(self, context: dict, min_quality_score: int = 8, max_review_iterations: int = 3, budget: CallBudget = None, artifact: str = None,
+            simple: bool = False) -> CodeFile:
+        best_draft, best_review = None, CodeReview(REVIEW="", SCORE=0)
+        current_draft, current_review = best_draft, best_review
+        review_count = 0
+
+        with ThreadPoolExecutor(max_workers=self._candidates) as executor:
+            while self._keep_going(best_review, review_count, min_quality_score, max_review_iterations, budget, artifact):
+                writer_data = {**context, "code": current_draft.RAW_CODE if current_draft else "", "review": current_review.REVIEW}
+                writer_tier, reviewer_tier = self._tiers(artifact, review_count, best_review, min_quality_score, budget, simple)
+                drafts = list(executor.map(lambda prompt: self._writer_agent.reply(prompt, writer_data, artifact, writer_tier), self._writer_prompts()))
+
+                # only drafts that pass the local checks are sent to the reviewer
+                checks = [self._check(draft) for draft in drafts]
+                replies = iter(executor.map(lambda draft: self._reviewer_agent.reply(self._reviewer_prompt, self._review_data(context, draft), artifact, reviewer_tier),
+                                            [draft for draft, check in zip(drafts, checks) if check is None]))
+                reviews = [check or next(replies) for check in checks]
+
+                self._charge(budget, artifact, context, writer_data, drafts, reviews, checks)
+                current_draft, current_review = self._select(None, None, drafts, reviews)
+                best_draft, best_review = self._select(best_draft, best_review, [current_draft], [current_review])
+                review_count += 1
+                self._report_round(artifact, review_count, current_review, best_review, writer_tier)
+
+        if self._telemetry is not None:
+            self._telemetry.record_review(self._name, artifact, review_count)
+
+        return best_draft
+
+    async def arun(self, context: dict, min_quality_score: int = 8, max_review_iterations: int = 3, budget: CallBudget = None, artifact: str = None,
+                   simple: bool = False) -> CodeFile:
+        best_draft, best_review = None, CodeReview(REVIEW="", SCORE=0)
+        current_draft, current_review = best_draft, best_review
+        review_count = 0
+
+        while self._keep_going(best_review, review_count, min_quality_score, max_review_iterations, budget, artifact):
+            writer_data = {**context, "code": current_draft.RAW_CODE if current_draft else "", "review": current_review.REVIEW}
+            writer_tier, reviewer_tier = self._tiers(artifact, review_count, best_review, min_quality_score, budget, simple)
+            drafts = await asyncio.gather(*[self._writer_agent.areply(prompt, writer_data, artifact, writer_tier) for prompt in self._writer_prompts()])
+
+            # only drafts that pass the local checks are sent to the reviewer
+            checks = [self._check(draft) for draft in drafts]
+            replies = iter(await asyncio.gather(*[self._reviewer_agent.areply(self._reviewer_prompt, self._review_data(context, draft), artifact, reviewer_tier)
+                                                  for draft, check in zip(drafts, checks) if check is None]))
+            reviews = [check or next(replies) for check in checks]
+
+            self._charge(budget, artifact, context, writer_data, drafts, reviews, checks)
+            current_draft, current_review = self._select(None, None, drafts, reviews)
+            best_draft, best_review = self._select(best_draft, best_review, [current_draft], [current_review])
+            review_count += 1
+            self._report_round(artifact, review_count, current_review, best_review, writer_tier)
+
+        if self._telemetry is not None:
+            self._telemetry.record_review(self._name, artifact, review_count)
+
+        return best_draft
+
+    def _report_round(self, artifact: str, review_count: int, current_review: CodeReview, best_review: CodeReview, writer_tier: str):
+        emit_progress({"type": "review", "loop": self._name, "artifact": artifact, "iteration": review_count,
+                       "score": current_review.SCORE, "best_score": best_review.SCORE, "tier": writer_tier})
+
+    @staticmethod
+    def _select(best_draft: CodeFile, best_review: CodeReview, drafts: list[CodeFile], reviews: list[CodeReview]):
+        for draft, review in zip(drafts, reviews):
+            # a newer draft replaces an equal score so the rewrite keeps moving forward
+            if best_draft is None or review.SCORE >= best_review.SCORE:
+                best_draft, best_review = draft, review
+
+        return best_draft, best_review
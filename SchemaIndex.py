@@ -0,0 +1,70 @@
+import re
+from collections import Counter
+from APIArchitectAgent import APIEndpoint
+from DynamoDBArchitectAgent import DynamoTable
+
+# Endpoint -> table relevance index.  Each Lambda developer only needs the tables its endpoint
+# reads or writes, so the schema in its prompts is cut down to those.  Tables are matched on the
+# words of their name, then of their key attributes, that set them apart from the other tables;
+# when nothing matches, the endpoint gets the full schema.
+
+_WORD = re.compile(r"[A-Z]?[a-z]+[0-9]*|[A-Z]+[0-9]*(?![a-z])|[0-9]+")
+_GENERIC_WORDS = {"table", "tbl", "data", "record", "id", "ids", "key", "the", "and", "for", "with"}
+
+
+def _singular(word: str) -> str:
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+
+    return word
+
+
+def words(text: str) -> set[str]:
+    # "BlogPosts", "blog_posts" and "/posts/{postId}" all give "blog"/"post"/"id" style words
+    return {_singular(word.lower()) for word in _WORD.findall(text or "")} - _GENERIC_WORDS
+
+
+def _key_words(table: DynamoTable) -> set[str]:
+    return set().union(words(table.PRIMARY_KEY), words(table.SORT_KEY), *(words(index.KEYS) for index in table.INDEXES))
+
+
+def _endpoint_words(endpoint: APIEndpoint) -> set[str]:
+    return words(" ".join([endpoint.NAME, endpoint.PATH, endpoint.DESCRIPTION, endpoint.REQUEST, endpoint.RESPONSE]))
+
+
+def _distinctive(word_sets: list[set[str]]) -> list[set[str]]:
+    # a word several tables share ("blog" in BlogPosts/BlogRatings) says little about which table is meant,
+    # so each table is matched on the words only it has, or on all of its words when it has none of its own
+    counts = Counter(word for word_set in word_sets for word in word_set)
+    return [{word for word in word_set if counts[word] == 1} or word_set for word_set in word_sets]
+
+
+def build_schema_index(endpoints: list[APIEndpoint], tables: list[DynamoTable]) -> dict[str, list[int]]:
+    # maps an endpoint NAME to the positions of the tables it touches, an empty list means "use the full schema"
+    if len(tables) <= 1:
+        return {endpoint.NAME: [] for endpoint in endpoints}
+
+    # table names are the strongest signal, key attributes (author, user_id, ...) are used when no name matches
+    name_words = _distinctive([words(table.TABLE_NAME) for table in tables])
+    key_words = _distinctive([_key_words(table) for table in tables])
+
+    index = {}
+    for endpoint in endpoints:
+        endpoint_words = _endpoint_words(endpoint)
+        matches = [position for position, table_words in enumerate(name_words) if table_words & endpoint_words]
+        if not matches:
+            matches = [position for position, table_words in enumerate(key_words) if table_words & endpoint_words]
+        index[endpoint.NAME] = matches if len(matches) < len(tables) else []
+
+    return index
+
+
+def schema_slice(tables: list, positions: list[int]) -> list:
+    # picks the indexed tables (or their serialized JSON) and falls back to the full schema
+    # when the endpoint is not in the index or matched nothing
+    if not positions or any(position >= len(tables) for position in positions):
+        return tables
+
+    return [tables[position] for position in positions]
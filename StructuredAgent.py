@@ -1,16 +1,356 @@
+import asyncio
+import concurrent.futures
+import json
+import time
+from string import Formatter
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import HumanMessage, SystemMessage
+from LLMCache import LLMCache
+from LLMScheduler import LLMScheduler, PRIORITY_WRITER, ainvoke_within, estimate_tokens, invoke_within
+from Telemetry import Telemetry
+from HedgePolicy import HedgePolicy
+from ModelRouter import ModelRouter
+
+class MessageTemplate:
+    # a str.format template that is parsed once and rendered many times
+    def __init__(self, template: str):
+        self._template = template
+        self._parts = []
+        self._simple = True
+
+        for literal, field_name, format_spec, conversion in Formatter().parse(template):
+            if field_name is not None and (format_spec or conversion or not field_name.isidentifier()):
+                # anything beyond plain {name} fields is left to str.format
+                self._simple = False
+            self._parts.append((literal, field_name))
+
+    def format(self, **merge_data) -> str:
+        if not self._simple:
+            return self._template.format(**merge_data)
+
+        rendered = []
+        for literal, field_name in self._parts:
+            rendered.append(literal)
+            if field_name is not None:
+                rendered.append(str(merge_data[field_name]))
+
+        return "".join(rendered)
+
+
+class StructuredOutputError(ValueError):
+    # a reply that did not parse into the agent's return type, reply is what the model sent
+    def __init__(self, message, reply: str = ""):
+        super().__init__(str(message))
+        self.reply = reply
+
+
+def reply_text(raw) -> str:
+    tool_calls = getattr(raw, "tool_calls", None)
+    if tool_calls:
+        return json.dumps(tool_calls[0].get("args"), default=str)
+
+    return str(getattr(raw, "content", raw))
+
+
+# threads for the synchronous replies that can be hedged
+_call_threads = None
+
+
+def call_threads() -> concurrent.futures.ThreadPoolExecutor:
+    global _call_threads
+    if _call_threads is None:
+        _call_threads = concurrent.futures.ThreadPoolExecutor(max_workers=32, thread_name_prefix="structured-agent")
+
+    return _call_threads
+
+
+def _granted(future):
+    # the scheduler calls on_start at every grant, a throttled call is granted again after its backoff
+    return lambda: future.done() or future.set_result(None)
+
+
+class _Binding:
+    # a model with the agent's schema bound to it, the agent has one for its own model and one per router tier
+    def __init__(self, model: BaseChatModel, return_type: type, cache: LLMCache, hedge_quantile: float):
+        # binding the schema is comparatively expensive, so it is done once,
+        # the raw reply is kept for its token usage and parse errors are returned instead of raised
+        self.structured = model.with_structured_output(return_type, include_raw=True)
+        self.model_identity = LLMCache.model_identity(model) if cache is not None else None
+        # slow calls are judged against the latencies of the same model
+        self.hedging = HedgePolicy(hedge_quantile) if hedge_quantile else None
+
 
 class StructuredAgent:
-    def __init__(self, model: BaseChatModel, system_message_template: str, return_type: type):
+    """
+    One prompt template bound to a chat model's structured output.
+
+    Every reply goes through the LLM cache and scheduler when the agent has them.  A reply that
+    does not parse is asked for again with the validation error attached, up to `attempts` calls.
+    With a `timeout` each call has a deadline and a late one is sent again, and with a
+    `hedge_quantile` a call slower than that quantile of the agent's recent calls gets a duplicate
+    request, the first valid reply wins (see HedgePolicy).  Both clocks start once the scheduler
+    grants the call a slot, time spent queued is not a slow reply.
+
+    With a ModelRouter a reply can name the `tier` to send it to, otherwise the agent's own model answers.
+    """
+
+    def __init__(self, model: BaseChatModel, system_message_template: str, return_type: type, cache: LLMCache = None, scheduler: LLMScheduler = None, priority: int = PRIORITY_WRITER,
+                 telemetry: Telemetry = None, name: str = None, timeout: float = None, attempts: int = 3, hedge_quantile: float = None,
+                 router: ModelRouter = None):
         self._model = model
-        self._system_message_template = system_message_template
+        self._system_message_template = MessageTemplate(system_message_template)
+        self._prompt_templates: dict[str, MessageTemplate] = {}
         self._return_type = return_type
+        self._cache = cache
+        self._scheduler = scheduler
+        self._priority = priority
+        self._telemetry = telemetry
+        self._name = name or return_type.__name__
+        self._return_schema = return_type.model_json_schema() if cache is not None else None
+        self._timeout = timeout
+        self._attempts = max(1, attempts)
+        self._bindings = {None: _Binding(model, return_type, cache, hedge_quantile)}
+        if router is not None:
+            for tier, tier_model in router.models.items():
+                self._bindings[tier] = _Binding(tier_model, return_type, cache, hedge_quantile)
+
+    def _build_messages(self, prompt: str, merge_data: dict) -> list:
+        prompt_template = self._prompt_templates.get(prompt)
+        if prompt_template is None:
+            prompt_template = self._prompt_templates[prompt] = MessageTemplate(prompt)
 
-    def reply(self, prompt: str, merge_data: dict):
         system_message = SystemMessage(content=self._system_message_template.format(**merge_data))
-        human_message = HumanMessage(content=prompt.format(**merge_data))
-        llm_with_structure = self._model.with_structured_output(self._return_type)
-        response = llm_with_structure.invoke([system_message]+[human_message])
+        human_message = HumanMessage(content=prompt_template.format(**merge_data))
+
+        return [system_message, human_message]
+
+    def _repair_messages(self, messages: list, error: StructuredOutputError) -> list:
+        # the invalid reply goes back to the model together with what was wrong with it
+        return messages + [HumanMessage(content=f"Your previous reply could not be used as a {self._return_type.__name__}:\n{error}\n\n"
+                                                f"Previous reply:\n{error.reply}\n\nReply again with every required field present and valid.")]
+
+    def estimate_tokens(self, prompt: str, merge_data: dict, response=None) -> int:
+        # rough prompt plus completion size, used for budgeting rather than billing
+        messages = self._build_messages(prompt, merge_data)
+        if response is not None:
+            messages.append(response.model_dump_json())
+
+        return estimate_tokens(messages)
+
+    def _cache_key(self, messages: list, tier: str):
+        if self._cache is None:
+            return None
+
+        return LLMCache.make_key(self._bindings[tier].model_identity, messages[0].content, messages[1].content, self._return_schema)
+
+    def _cached(self, cache_key, artifact: str, tier: str):
+        if cache_key is None:
+            return None
+
+        return self._record_cached(self._cache.get(cache_key, self._return_type), artifact, tier)
+
+    async def _acached(self, cache_key, artifact: str, tier: str):
+        if cache_key is None:
+            return None
+
+        return self._record_cached(await self._cache.aget(cache_key, self._return_type), artifact, tier)
+
+    def _record_cached(self, cached_response, artifact: str, tier: str):
+        if cached_response is not None and self._telemetry is not None:
+            self._telemetry.record_call(self._name, artifact, cached=True, tier=tier)
+
+        return cached_response
+
+    def _record(self, artifact: str, tier: str, started_at: float, call_stats: dict, messages: list, raw=None, **flags):
+        if self._telemetry is None:
+            return
+
+        # providers report the real token usage on the raw message, fall back to an estimate
+        usage = getattr(raw, "usage_metadata", None) or {}
+        self._telemetry.record_call(self._name, artifact, time.perf_counter() - started_at, call_stats.get("queue_wait_seconds", 0.0),
+                                    usage.get("input_tokens", estimate_tokens(messages)), usage.get("output_tokens", 0), call_stats.get("retries", 0), tier=tier, **flags)
+
+    def _count(self, name: str):
+        if self._telemetry is not None:
+            self._telemetry.count(self._name, name)
+
+    def _parse(self, result: dict, artifact: str, tier: str, started_at: float, call_stats: dict, messages: list):
+        # a reply without the structured output counts as a parse failure too
+        failed = result["parsing_error"] is not None or result["parsed"] is None
+        self._record(artifact, tier, started_at, call_stats, messages, result["raw"], parse_failure=failed)
+        if failed:
+            raise StructuredOutputError(result["parsing_error"] or "the reply had no structured output", reply_text(result["raw"]))
+
+        hedging = self._bindings[tier].hedging
+        if hedging is not None:
+            hedging.record(call_stats.get("model_latency_seconds", time.perf_counter() - started_at))
+
+        return result["parsed"]
+
+    def _call(self, messages: list, artifact: str, tier: str, on_start=None):
+        structured = self._bindings[tier].structured
+        started_at = time.perf_counter()
+        call_stats = {}
+        try:
+            if self._scheduler is not None:
+                result = self._scheduler.run(structured, messages, self._priority, call_stats, self._timeout, on_start)
+            else:
+                if on_start is not None:
+                    on_start()
+                result = invoke_within(structured, messages, self._timeout)
+        except TimeoutError:
+            self._record(artifact, tier, started_at, call_stats, messages, error=True)
+            raise self._timed_out() from None
+        except Exception:
+            self._record(artifact, tier, started_at, call_stats, messages, error=True)
+            raise
+
+        return self._parse(result, artifact, tier, started_at, call_stats, messages)
+
+    async def _acall(self, messages: list, artifact: str, tier: str, on_start=None):
+        structured = self._bindings[tier].structured
+        started_at = time.perf_counter()
+        call_stats = {}
+        try:
+            if self._scheduler is not None:
+                result = await self._scheduler.arun(structured, messages, self._priority, call_stats, self._timeout, on_start)
+            else:
+                if on_start is not None:
+                    on_start()
+                result = await ainvoke_within(structured, messages, self._timeout)
+        except TimeoutError:
+            self._record(artifact, tier, started_at, call_stats, messages, error=True)
+            raise self._timed_out() from None
+        except Exception:
+            self._record(artifact, tier, started_at, call_stats, messages, error=True)
+            raise
+
+        return self._parse(result, artifact, tier, started_at, call_stats, messages)
+
+    def _timed_out(self):
+        self._count("timeouts")
+        return TimeoutError(f"{self._name} did not reply within {self._timeout}s")
+
+    def _attempt(self, messages: list, artifact: str, tier: str):
+        hedging = self._bindings[tier].hedging
+        delay = hedging.delay() if hedging is not None else None
+        if delay is None:
+            return self._call(messages, artifact, tier)
+
+        # threads cannot be cancelled, a call that lost the race finishes in the background and is ignored
+        granted = concurrent.futures.Future()
+        first = call_threads().submit(self._call, messages, artifact, tier, _granted(granted))
+        concurrent.futures.wait({first, granted}, return_when=concurrent.futures.FIRST_COMPLETED)
+        done, _ = concurrent.futures.wait({first}, timeout=delay)
+        if done or not hedging.try_hedge():
+            return first.result()
+
+        self._count("hedges")
+        pending = {first, call_threads().submit(self._call, messages, artifact, tier)}
+        error = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for call in done:
+                if call.exception() is None:
+                    if call is not first:
+                        self._count("hedge_wins")
+                    return call.result()
+                error = error or call.exception()
+
+        raise error
+
+    async def _aattempt(self, messages: list, artifact: str, tier: str):
+        hedging = self._bindings[tier].hedging
+        delay = hedging.delay() if hedging is not None else None
+        if delay is None:
+            return await self._acall(messages, artifact, tier)
+
+        granted = asyncio.get_running_loop().create_future()
+        first = asyncio.ensure_future(self._acall(messages, artifact, tier, _granted(granted)))
+        calls = [first]
+        try:
+            await asyncio.wait({first, granted}, return_when=asyncio.FIRST_COMPLETED)
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done or not hedging.try_hedge():
+                return await first
+
+            self._count("hedges")
+            calls.append(asyncio.ensure_future(self._acall(messages, artifact, tier)))
+            pending = set(calls)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for call in done:
+                    if call.exception() is None:
+                        if call is not first:
+                            self._count("hedge_wins")
+                        return call.result()
+                    error = error or call.exception()
+
+            raise error
+        finally:
+            # the slower request is cancelled, which also frees its scheduler slot
+            granted.cancel()
+            for call in calls:
+                if not call.done():
+                    call.cancel()
+
+    def _retry(self, attempt: int, messages: list, attempt_messages: list, error: Exception) -> list:
+        # the messages for the next attempt, or None when the error is final
+        if attempt + 1 >= self._attempts:
+            return None
+        if isinstance(error, StructuredOutputError):
+            self._count("repairs")
+            return self._repair_messages(messages, error)
+        if isinstance(error, TimeoutError):
+            return attempt_messages
+
+        return None
+
+    def reply(self, prompt: str, merge_data: dict, artifact: str = None, tier: str = None):
+        messages = self._build_messages(prompt, merge_data)
+
+        # reuse a previous identical reply when caching is enabled
+        cache_key = self._cache_key(messages, tier)
+        cached_response = self._cached(cache_key, artifact, tier)
+        if cached_response is not None:
+            return cached_response
+
+        attempt_messages = messages
+        for attempt in range(self._attempts):
+            try:
+                response = self._attempt(attempt_messages, artifact, tier)
+                break
+            except (StructuredOutputError, TimeoutError) as e:
+                attempt_messages = self._retry(attempt, messages, attempt_messages, e)
+                if attempt_messages is None:
+                    raise
+
+        if cache_key is not None:
+            self._cache.put(cache_key, response)
+
+        return response
+
+    async def areply(self, prompt: str, merge_data: dict, artifact: str = None, tier: str = None):
+        messages = self._build_messages(prompt, merge_data)
+
+        # reuse a previous identical reply when caching is enabled
+        cache_key = self._cache_key(messages, tier)
+        cached_response = await self._acached(cache_key, artifact, tier)
+        if cached_response is not None:
+            return cached_response
+
+        attempt_messages = messages
+        for attempt in range(self._attempts):
+            try:
+                response = await self._aattempt(attempt_messages, artifact, tier)
+                break
+            except (StructuredOutputError, TimeoutError) as e:
+                attempt_messages = self._retry(attempt, messages, attempt_messages, e)
+                if attempt_messages is None:
+                    raise
+
+        if cache_key is not None:
+            await self._cache.aput(cache_key, response)
 
         return response
@@ -0,0 +1,367 @@
+import asyncio
+import contextlib
+import contextvars
+import copy
+import functools
+import threading
+import time
+from langgraph.config import get_stream_writer
+
+# upper bounds, in seconds, of the Prometheus latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# upper bounds of the review iteration histogram buckets
+ITERATION_BUCKETS = (1, 2, 3, 4, 5, 8)
+
+
+def summarize(values: list[float]) -> dict:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "total_seconds": sum(ordered),
+        "mean_seconds": sum(ordered) / len(ordered) if ordered else 0.0,
+        "p95_seconds": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))] if ordered else 0.0,
+        "max_seconds": ordered[-1] if ordered else 0.0,
+    }
+
+
+# where a WorkerPool task's records go instead of the worker's own Telemetry, the task sends them back with its result
+task_telemetry = contextvars.ContextVar("task_telemetry", default=None)
+
+
+def _redirected(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        sink = task_telemetry.get()
+        return method(sink if sink is not None else self, *args, **kwargs)
+
+    return wrapper
+
+
+class Telemetry:
+    """
+    Run-wide record of LLM calls, graph nodes and tool calls.
+
+    StructuredAgent records every reply (wall time, scheduler queue time, prompt and completion
+    tokens, retries, cache hits and structured output parse failures) against its agent name
+    and the artifact it was working on.  It also counts each agent's timeouts, repair re-asks
+    and hedged duplicates.  ReviewLoop records how many rounds each artifact took, and
+    `timed_node` / `tool` time graph nodes and research tools.  Calls sent to a model tier
+    are also totalled per tier, next to the tier a ModelRouter picked for each call and why.
+    `report()` returns the JSON run report and `prometheus()` the same numbers in the
+    Prometheus text format.  `export()` and `merge()` carry the records of a worker process
+    task over to the run's Telemetry.
+    """
+
+    def __init__(self, prompt_cost_per_million: float = None, completion_cost_per_million: float = None):
+        self.prompt_cost_per_million = prompt_cost_per_million
+        self.completion_cost_per_million = completion_cost_per_million
+
+        self._lock = threading.Lock()
+        self._started_at = time.perf_counter()
+        self._agents = {}
+        self._artifacts = {}
+        self._spans = {"node": {}, "tool": {}}
+        self._reviews = {}
+        self._tiers = {}
+        self._routes = {}
+
+    def _now(self) -> float:
+        return time.perf_counter() - self._started_at
+
+    @_redirected
+    def record_call(self, agent: str, artifact: str = None, wall_seconds: float = 0.0, queue_seconds: float = 0.0, prompt_tokens: int = 0,
+                    completion_tokens: int = 0, retries: int = 0, cached: bool = False, parse_failure: bool = False, error: bool = False, tier: str = None):
+        finished_at = self._now()
+        with self._lock:
+            entry = self._agent(agent)
+            entry["calls"] += 1
+            entry["cached"] += int(cached)
+            entry["errors"] += int(error)
+            entry["parse_failures"] += int(parse_failure)
+            entry["retries"] += retries
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            if not cached:
+                entry["latency"].append(wall_seconds)
+                entry["queue"].append(queue_seconds)
+
+            if tier is not None:
+                tier_entry = self._tier(tier)
+                tier_entry["calls"] += 1
+                tier_entry["cached"] += int(cached)
+                tier_entry["prompt_tokens"] += prompt_tokens
+                tier_entry["completion_tokens"] += completion_tokens
+                if not cached:
+                    tier_entry["latency"].append(wall_seconds)
+
+            if artifact is not None:
+                artifact_entry = self._artifact(artifact, finished_at - wall_seconds)
+                artifact_entry["calls"] += 1
+                artifact_entry["prompt_tokens"] += prompt_tokens
+                artifact_entry["completion_tokens"] += completion_tokens
+                artifact_entry["wall_seconds"] += wall_seconds
+                artifact_entry["queue_seconds"] += queue_seconds
+                artifact_entry["started_at"] = min(artifact_entry["started_at"], finished_at - wall_seconds)
+                artifact_entry["finished_at"] = max(artifact_entry["finished_at"], finished_at)
+
+    def _agent(self, agent: str) -> dict:
+        return self._agents.setdefault(agent, {"calls": 0, "cached": 0, "errors": 0, "parse_failures": 0, "retries": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                               "timeouts": 0, "repairs": 0, "hedges": 0, "hedge_wins": 0, "latency": [], "queue": []})
+
+    def _tier(self, tier: str) -> dict:
+        return self._tiers.setdefault(tier, {"calls": 0, "cached": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency": []})
+
+    def _artifact(self, artifact: str, started_at: float) -> dict:
+        return self._artifacts.setdefault(artifact, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "wall_seconds": 0.0,
+                                                     "queue_seconds": 0.0, "started_at": started_at, "finished_at": 0.0})
+
+    @_redirected
+    def count(self, agent: str, name: str):
+        # one of an agent's reply events: timeouts, repairs (re-asks after a parse failure), hedges and hedge_wins
+        with self._lock:
+            self._agent(agent)[name] += 1
+
+    @_redirected
+    def record_review(self, loop: str, artifact: str, iterations: int):
+        with self._lock:
+            self._reviews.setdefault(loop, {})[artifact] = iterations
+
+    @_redirected
+    def record_route(self, loop: str, artifact: str, round_index: int, role: str, tier: str, reason: str):
+        # the model tier a ModelRouter picked for one writer or reviewer call and the reason for it
+        with self._lock:
+            self._routes.setdefault(loop, {}).setdefault(artifact, []).append({"round": round_index, "role": role, "tier": tier, "reason": reason})
+
+    @_redirected
+    def record_span(self, kind: str, name: str, seconds: float, error: bool = False):
+        with self._lock:
+            entry = self._spans[kind].setdefault(name, {"errors": 0, "latency": []})
+            entry["latency"].append(seconds)
+            entry["errors"] += int(error)
+
+    def export(self) -> dict:
+        # the raw records, picklable, with the clock they were taken against
+        with self._lock:
+            return copy.deepcopy({"started_at": self._started_at, "agents": self._agents, "artifacts": self._artifacts, "spans": self._spans,
+                                  "reviews": self._reviews, "tiers": self._tiers, "routes": self._routes})
+
+    def merge(self, exported: dict):
+        # adds records from export(), perf_counter is system wide so the artifact times only need moving to this clock
+        offset = exported["started_at"] - self._started_at
+
+        def add(target: dict, source: dict):
+            for key, value in source.items():
+                target[key] += value
+
+        with self._lock:
+            for name, entry in exported["agents"].items():
+                add(self._agent(name), entry)
+            for name, entry in exported["tiers"].items():
+                add(self._tier(name), entry)
+            for name, entry in exported["artifacts"].items():
+                target = self._artifact(name, entry["started_at"] + offset)
+                add(target, {key: entry[key] for key in ("calls", "prompt_tokens", "completion_tokens", "wall_seconds", "queue_seconds")})
+                target["started_at"] = min(target["started_at"], entry["started_at"] + offset)
+                target["finished_at"] = max(target["finished_at"], entry["finished_at"] + offset)
+            for kind, entries in exported["spans"].items():
+                for name, entry in entries.items():
+                    add(self._spans[kind].setdefault(name, {"errors": 0, "latency": []}), entry)
+            for loop, iterations in exported["reviews"].items():
+                self._reviews.setdefault(loop, {}).update(iterations)
+            for loop, routes in exported["routes"].items():
+                for artifact, entries in routes.items():
+                    self._routes.setdefault(loop, {}).setdefault(artifact, []).extend(entries)
+
+    @contextlib.contextmanager
+    def track(self, kind: str, name: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.record_span(kind, name, time.perf_counter() - started_at, error=True)
+            raise
+        self.record_span(kind, name, time.perf_counter() - started_at)
+
+    def tool(self, func, name: str = None):
+        # wraps a research tool, the signature and docstring the tool schema is built from are kept
+        name = name or func.__name__
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with self.track("tool", name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.track("tool", name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    def _cost(self, prompt_tokens: int, completion_tokens: int):
+        if self.prompt_cost_per_million is None and self.completion_cost_per_million is None:
+            return None
+
+        return (prompt_tokens * (self.prompt_cost_per_million or 0.0) + completion_tokens * (self.completion_cost_per_million or 0.0)) / 1_000_000
+
+    def report(self) -> dict:
+        with self._lock:
+            agents = {}
+            for name, entry in self._agents.items():
+                agents[name] = {key: entry[key] for key in ("calls", "cached", "errors", "parse_failures", "retries", "prompt_tokens", "completion_tokens",
+                                                            "timeouts", "repairs", "hedges", "hedge_wins")}
+                agents[name]["cost"] = self._cost(entry["prompt_tokens"], entry["completion_tokens"])
+                agents[name]["latency"] = summarize(entry["latency"])
+                agents[name]["queue_wait"] = summarize(entry["queue"])
+
+            artifacts = {}
+            for name, entry in self._artifacts.items():
+                artifacts[name] = dict(entry, span_seconds=entry["finished_at"] - entry["started_at"], cost=self._cost(entry["prompt_tokens"], entry["completion_tokens"]))
+            for loop, iterations in self._reviews.items():
+                for artifact, count in iterations.items():
+                    artifacts.setdefault(artifact, {})["review_iterations"] = count
+
+            # the writer tier of each round, e.g. ["small", "large"] for an artifact that was escalated after its first round
+            routing = {}
+            for loop, routes in self._routes.items():
+                decisions = routing.setdefault(loop, {})
+                for artifact, entries in routes.items():
+                    for entry in entries:
+                        key = f"{entry['role']}:{entry['tier']}:{entry['reason']}"
+                        decisions[key] = decisions.get(key, 0) + 1
+                    artifacts.setdefault(artifact, {})["writer_tiers"] = [entry["tier"] for entry in entries if entry["role"] == "writer"]
+
+            tiers = {name: dict({key: entry[key] for key in ("calls", "cached", "prompt_tokens", "completion_tokens")}, latency=summarize(entry["latency"]))
+                     for name, entry in self._tiers.items()}
+
+            spans = {kind: {name: dict(summarize(entry["latency"]), errors=entry["errors"]) for name, entry in entries.items()}
+                     for kind, entries in self._spans.items()}
+            elapsed = self._now()
+
+        prompt_tokens = sum(agent["prompt_tokens"] for agent in agents.values())
+        completion_tokens = sum(agent["completion_tokens"] for agent in agents.values())
+
+        # the artifacts that finished last are the ones that kept the run going
+        critical_path = sorted((name for name, entry in artifacts.items() if "finished_at" in entry), key=lambda name: artifacts[name]["finished_at"], reverse=True)
+
+        return {
+            "elapsed_seconds": elapsed,
+            "llm_calls": sum(agent["calls"] for agent in agents.values()),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost": self._cost(prompt_tokens, completion_tokens),
+            "agents": agents,
+            "tiers": tiers,
+            "routing": routing,
+            "nodes": spans["node"],
+            "tools": spans["tool"],
+            "artifacts": artifacts,
+            "critical_path": critical_path[:5],
+        }
+
+    def prometheus(self) -> str:
+        lines = []
+
+        def metric(name: str, kind: str, description: str):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name: str, label: str, series: dict, buckets: tuple):
+            for label_value, values in series.items():
+                for bound in buckets:
+                    lines.append(f'{name}_bucket{{{label}="{label_value}",le="{bound}"}} {sum(1 for value in values if value <= bound)}')
+                lines.append(f'{name}_bucket{{{label}="{label_value}",le="+Inf"}} {len(values)}')
+                lines.append(f'{name}_sum{{{label}="{label_value}"}} {sum(values)}')
+                lines.append(f'{name}_count{{{label}="{label_value}"}} {len(values)}')
+
+        with self._lock:
+            agents = {name: dict(entry) for name, entry in self._agents.items()}
+            spans = {kind: {name: dict(entry) for name, entry in entries.items()} for kind, entries in self._spans.items()}
+            reviews = {loop: list(iterations.values()) for loop, iterations in self._reviews.items()}
+            tiers = {name: list(entry["latency"]) for name, entry in self._tiers.items()}
+            routes = {}
+            for loop, entries in self._routes.items():
+                for entry in (entry for artifact_entries in entries.values() for entry in artifact_entries):
+                    key = (loop, entry["role"], entry["tier"])
+                    routes[key] = routes.get(key, 0) + 1
+
+        for key, description in (("calls", "LLM calls, including cache hits"), ("cached", "LLM calls answered from the cache"),
+                                 ("errors", "LLM calls that raised"), ("parse_failures", "structured output replies that failed to parse"),
+                                 ("retries", "LLM calls retried after throttling"), ("prompt_tokens", "prompt tokens sent"),
+                                 ("completion_tokens", "completion tokens received"), ("timeouts", "LLM calls that missed their deadline"),
+                                 ("repairs", "replies asked again after a parse failure"), ("hedges", "duplicate requests sent for slow calls"),
+                                 ("hedge_wins", "hedged calls the duplicate answered first")):
+            metric(f"llm_{key}_total", "counter", description)
+            for name, entry in agents.items():
+                lines.append(f'llm_{key}_total{{agent="{name}"}} {entry[key]}')
+
+        metric("llm_call_duration_seconds", "histogram", "wall time of an LLM call, queue wait included")
+        histogram("llm_call_duration_seconds", "agent", {name: entry["latency"] for name, entry in agents.items()}, LATENCY_BUCKETS)
+        metric("llm_queue_wait_seconds", "histogram", "time an LLM call waited in the scheduler")
+        histogram("llm_queue_wait_seconds", "agent", {name: entry["queue"] for name, entry in agents.items()}, LATENCY_BUCKETS)
+
+        metric("llm_tier_call_duration_seconds", "histogram", "wall time of an LLM call sent to a model tier")
+        histogram("llm_tier_call_duration_seconds", "tier", tiers, LATENCY_BUCKETS)
+        metric("llm_route_decisions_total", "counter", "model tier picked for a review loop call")
+        for (loop, role, tier), count in routes.items():
+            lines.append(f'llm_route_decisions_total{{loop="{loop}",role="{role}",tier="{tier}"}} {count}')
+
+        for kind, prefix, description in (("node", "graph_node", "graph node"), ("tool", "tool_call", "research tool call")):
+            metric(f"{prefix}_duration_seconds", "histogram", f"wall time of a {description}")
+            histogram(f"{prefix}_duration_seconds", kind, {name: entry["latency"] for name, entry in spans[kind].items()}, LATENCY_BUCKETS)
+            metric(f"{prefix}_errors_total", "counter", f"{description}s that raised")
+            for name, entry in spans[kind].items():
+                lines.append(f'{prefix}_errors_total{{{kind}="{name}"}} {entry["errors"]}')
+
+        metric("review_iterations", "histogram", "review rounds per artifact")
+        histogram("review_iterations", "loop", reviews, ITERATION_BUCKETS)
+
+        return "\n".join(lines) + "\n"
+
+
+def timed_node(name: str, node, get_telemetry):
+    # wraps a graph node so its wall time is recorded in the Telemetry get_telemetry(config) returns
+    if asyncio.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def async_wrapper(state, config):
+            telemetry = get_telemetry(config)
+            if telemetry is None:
+                return await node(state, config)
+            with telemetry.track("node", name):
+                return await node(state, config)
+
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(state, config):
+        telemetry = get_telemetry(config)
+        if telemetry is None:
+            return node(state, config)
+        with telemetry.track("node", name):
+            return node(state, config)
+
+    return wrapper
+
+
+# where progress events go when they are not emitted inside a running graph, a WorkerPool worker sets it per task
+progress_sink = contextvars.ContextVar("progress_sink", default=None)
+
+
+def progress_writer():
+    sink = progress_sink.get()
+    if sink is not None:
+        return sink
+
+    # inside a graph run the events go to its "custom" stream, outside of one nobody is listening
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return None
+
+
+def emit_progress(event: dict):
+    writer = progress_writer()
+    if writer is not None:
+        writer(event)
@@ -0,0 +1,187 @@
+import asyncio
+import datetime
+import functools
+import inspect
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+_DATE = re.compile(r"^(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})$")
+_SPACE = re.compile(r"\s+")
+
+# what waiting callers get when the call they joined was cancelled, one of them runs the tool instead
+_ABANDONED = object()
+
+
+def normalize_value(value):
+    # "  Apple   STOCK " and "apple stock" are the same query, "2024-1-5" and "2024/01/05" the same date
+    if isinstance(value, str):
+        match = _DATE.match(value.strip())
+        if match:
+            try:
+                return normalize_date(datetime.date(*(int(part) for part in match.groups())))
+            except ValueError:
+                pass
+        return _SPACE.sub(" ", value).strip().casefold()
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: normalize_value(item) for key, item in value.items()}
+
+    return value
+
+
+def normalize_date(date: datetime.date) -> str:
+    # date ranges end at most tomorrow (the end date is exclusive), anything later asks for the same data
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    return min(date, tomorrow).isoformat()
+
+
+class ToolCache:
+    """
+    In-memory cache of research tool results with a time to live per tool.
+
+    Keys are built from the tool name and its bound arguments after normalization (case,
+    whitespace and date formats), so the agent re-asking the same question with slightly
+    different spelling reuses the earlier result.  Concurrent calls with the same key are
+    coalesced: the first one runs the tool and the others wait for its result.  Empty
+    results (None) and exceptions are never cached.  When the first call is cancelled the
+    others are not, one of them runs the tool in its place.
+    """
+
+    def __init__(self, ttl_seconds: dict[str, float] = None, default_ttl_seconds: float = 15 * 60, max_entries: int = 1000):
+        self._ttl_seconds = dict(ttl_seconds or {})
+        self._default_ttl_seconds = default_ttl_seconds
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def ttl(self, name: str) -> float:
+        return self._ttl_seconds.get(name, self._default_ttl_seconds)
+
+    @staticmethod
+    def make_key(name: str, arguments: dict) -> str:
+        return json.dumps([name, normalize_value(arguments)], sort_keys=True, default=str)
+
+    def _lookup(self, key: str):
+        # returns (True, value) on a fresh hit, (False, future) when the caller joins an in-flight call,
+        # or (None, future) when the caller has to run the tool and settle the future
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return False, future
+
+            self.misses += 1
+            future = self._in_flight[key] = Future()
+            return None, future
+
+    def _settle(self, name: str, key: str, future: Future, value=None, error: Exception = None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if error is None and value is not None and self.ttl(name) > 0:
+                self._entries[key] = (time.monotonic() + self.ttl(name), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+
+        if error is None:
+            future.set_result(value)
+        else:
+            future.set_exception(error)
+
+    def _abandon(self, key: str, future: Future):
+        # the caller running the tool was cancelled, waiting callers look the key up again
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+        future.set_result(_ABANDONED)
+
+    def cached(self, func, name: str = None):
+        # wraps a tool function, the signature and docstring the tool schema is built from are kept.
+        # A sync function and its async variant registered under the same name share their entries
+        name = name or func.__name__
+        signature = inspect.signature(func)
+
+        def key_of(args, kwargs) -> str:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return self.make_key(name, bound.arguments)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = key_of(args, kwargs)
+                found, value = self._lookup(key)
+                while found is False:
+                    # shielded, a cancelled waiter must not cancel the call the others are waiting for
+                    result = await asyncio.shield(asyncio.wrap_future(value))
+                    if result is not _ABANDONED:
+                        return result
+                    found, value = self._lookup(key)
+                if found:
+                    return value
+
+                try:
+                    result = await func(*args, **kwargs)
+                except asyncio.CancelledError:
+                    # the cancellation is this caller's alone, the waiting callers take over
+                    self._abandon(key, value)
+                    raise
+                except BaseException as e:
+                    self._settle(name, key, value, error=e)
+                    raise
+                self._settle(name, key, value, result)
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = key_of(args, kwargs)
+            found, value = self._lookup(key)
+            while found is False:
+                result = value.result()
+                if result is not _ABANDONED:
+                    return result
+                found, value = self._lookup(key)
+            if found:
+                return value
+
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                self._settle(name, key, value, error=e)
+                raise
+            self._settle(name, key, value, result)
+            return result
+
+        return wrapper
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = len(self._entries)
+
+        lookups = self.hits + self.misses + self.coalesced
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0, "entries": entries}
@@ -0,0 +1,246 @@
+import asyncio
+import contextvars
+import itertools
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+from CallBudget import CallBudget
+from Telemetry import Telemetry, progress_sink, progress_writer, task_telemetry
+
+
+class WorkerPool:
+    """
+    Pool of worker processes that run agent calls for the graph.
+
+    Each worker builds its own agents with `agents_factory(workers)` (the worker count lets the
+    factory split rate limits between the processes), then takes tasks from a shared queue and
+    runs up to `concurrency_per_worker` of them at a time on its own event loop.  A task names
+    an agent attribute and one of its async methods, e.g. ("lambda_developer", "awrite_lambda"),
+    so the prompt formatting, pydantic validation and JSON work of the review loops is spread
+    over several CPUs while the graph itself, and its reducers, stay in the parent process.
+
+    Budgets cannot be shared between processes: a task runs with a CallBudget built from the
+    run budget's settings and capped at the artifact's share of what is left of its caps, and
+    the artifact's calls, tokens and scores are merged back into the run budget when the task
+    finishes.  The same goes for the
+    telemetry a task records, which is merged into the Telemetry passed to `run`.  Progress
+    events a task emits (review rounds) are sent back and passed on to the stream of the graph
+    that queued it.
+
+    A worker reports its pid when it takes a task.  When a worker process dies only the tasks it
+    had taken fail, and it is started again once.  Once no worker is left every pending task
+    fails and the pool takes no new ones.
+    """
+
+    def __init__(self, workers: int, agents_factory, concurrency_per_worker: int = 16):
+        self._context = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        self._worker_args = (agents_factory, workers, concurrency_per_worker, self._tasks, self._results)
+        self._processes = [self._new_process() for _ in range(workers)]
+        self._respawned = set()
+        self._broken = False
+        self._stopping = False
+        self._pending = {}
+        self._owners = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closing = threading.Event()
+        self._reader = threading.Thread(target=self._read_results, daemon=True)
+
+    def _new_process(self):
+        return self._context.Process(target=_worker_main, args=self._worker_args, daemon=True)
+
+    def start(self):
+        for process in self._processes:
+            process.start()
+
+        # wait until every worker has built its agents, so a broken factory fails here and not on the first task
+        for _ in self._processes:
+            _, ready, error = self._results.get()
+            if not ready:
+                self._tasks.close()
+                for process in self._processes:
+                    process.terminate()
+                raise error
+
+        self._reader.start()
+        return self
+
+    def close(self):
+        # workers exit once they get the stop sentinel, which must not look like a crash
+        self._stopping = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join()
+        self._closing.set()
+        self._reader.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def run(self, agent: str, method: str, args: tuple, kwargs: dict = None, budget: CallBudget = None, artifact: str = None,
+                  telemetry: Telemetry = None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        task_id = next(self._ids)
+        with self._lock:
+            if self._broken:
+                raise RuntimeError("Every worker process has exited")
+            # the stream writer only works inside the context of the node that queued the task
+            self._pending[task_id] = (loop, future, progress_writer(), contextvars.copy_context())
+
+        settings = budget.worker_settings(artifact) if budget is not None else None
+        self._tasks.put((task_id, agent, method, args, kwargs or {}, settings, artifact))
+
+        try:
+            result, report, telemetry_records = await future
+        except BaseException:
+            if budget is not None:
+                budget.release(artifact)
+            raise
+        if budget is not None and report is not None:
+            budget.merge(artifact, report)
+        if telemetry is not None:
+            telemetry.merge(telemetry_records)
+
+        return result
+
+    def _progress(self, task_id: int, event: dict):
+        with self._lock:
+            loop, _, writer, context = self._pending.get(task_id, (None, None, None, None))
+        if writer is not None:
+            # the stream writer belongs to the graph's event loop
+            loop.call_soon_threadsafe(writer, event, context=context)
+
+    def _resolve(self, task_id: int, succeeded: bool, value):
+        with self._lock:
+            loop, future, _, _ = self._pending.pop(task_id, (None, None, None, None))
+            self._owners.pop(task_id, None)
+        if future is None:
+            return
+
+        def settle():
+            if future.done():
+                return
+            if succeeded:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+        loop.call_soon_threadsafe(settle)
+
+    def _read_results(self):
+        while True:
+            try:
+                task_id, succeeded, value = self._results.get(timeout=0.5)
+            except queue.Empty:
+                if self._closing.is_set():
+                    return
+                self._check_workers()
+                continue
+
+            if task_id is None:
+                # the ready message of a replacement worker
+                continue
+            if succeeded == _TAKEN:
+                with self._lock:
+                    if task_id in self._pending:
+                        self._owners[task_id] = value
+            elif succeeded is None:
+                self._progress(task_id, value)
+            else:
+                self._resolve(task_id, succeeded, value)
+
+    def _check_workers(self):
+        # a worker that died takes the tasks it had taken with it, the tasks still queued are left to the other workers
+        if self._stopping:
+            return
+
+        for index, process in enumerate(self._processes):
+            if process.is_alive() or process.exitcode is None:
+                continue
+
+            with self._lock:
+                task_ids = [task_id for task_id, pid in self._owners.items() if pid == process.pid]
+            for task_id in task_ids:
+                self._resolve(task_id, False, RuntimeError(f"Worker process {process.pid} exited with code {process.exitcode} while running the task"))
+
+            if index not in self._respawned:
+                self._respawned.add(index)
+                self._processes[index] = self._new_process()
+                self._processes[index].start()
+
+        if not any(process.is_alive() or process.exitcode is None for process in self._processes):
+            with self._lock:
+                self._broken = True
+                task_ids = list(self._pending)
+            for task_id in task_ids:
+                self._resolve(task_id, False, RuntimeError("Every worker process has exited"))
+
+
+# a worker took a task off the queue, the message carries its pid
+_TAKEN = "taken"
+
+
+def _picklable(error: Exception) -> Exception:
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+
+def _worker_main(agents_factory, workers: int, concurrency: int, tasks, results):
+    try:
+        agents = agents_factory(workers)
+    except Exception as e:
+        results.put((None, False, _picklable(e)))
+        return
+
+    results.put((None, True, None))
+    asyncio.run(_serve(agents, concurrency, tasks, results))
+
+
+async def _serve(agents, concurrency: int, tasks, results):
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(concurrency)
+    running = set()
+
+    while True:
+        # only take a task off the shared queue when there is a free slot, so idle workers get the rest
+        await slots.acquire()
+        item = await loop.run_in_executor(None, tasks.get)
+        if item is None:
+            slots.release()
+            break
+        results.put((item[0], _TAKEN, os.getpid()))
+
+        task = asyncio.create_task(_run_task(agents, item, results, slots))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    await asyncio.gather(*running)
+
+
+async def _run_task(agents, item, results, slots: asyncio.Semaphore):
+    task_id, agent, method, args, kwargs, settings, artifact = item
+    # each task runs in its own asyncio context, so the sink only sees this task's events
+    progress_sink.set(lambda event: results.put((task_id, None, event)))
+    telemetry = Telemetry()
+    task_telemetry.set(telemetry)
+    try:
+        budget = CallBudget(**settings) if settings is not None else None
+        result = await getattr(getattr(agents, agent), method)(*args, budget=budget, artifact=artifact, **kwargs)
+        results.put((task_id, True, (result, budget.artifact_report(artifact) if budget is not None else None, telemetry.export())))
+    except Exception as e:
+        results.put((task_id, False, _picklable(e)))
+    finally:
+        slots.release()
@@ -0,0 +1,442 @@
+import argparse
+import asyncio
+import contextlib
+import functools
+import io
+import json
+import pickle
+import statistics
+import time
+import tracemalloc
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from FakeChatModel import FakeChatModel
+from LLMScheduler import LLMScheduler, estimate_tokens
+from ResearchClients import compact_history
+from Telemetry import Telemetry
+from WorkerPool import WorkerPool
+import dev_team
+import research_agent
+
+# Runs the dev_team and research_agent graphs against FakeChatModel, so orchestration
+# overhead and fan-out scaling can be measured without Azure costs or network jitter.
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def summarize(values: list[float]) -> dict:
+    return {"count": len(values), "mean": statistics.fmean(values) if values else 0.0, "p95": percentile(values, 0.95), "max": max(values, default=0.0)}
+
+
+async def timed_stream(app, inputs, config: dict) -> dict:
+    # the "tasks" stream reports every node start and finish, which gives per-node latency
+    started_at = {}
+    node_latency = {}
+    async for event in app.astream(inputs, config=config, stream_mode="tasks"):
+        if "result" in event:
+            elapsed = time.perf_counter() - started_at.pop(event["id"])
+            node_latency.setdefault(event["name"], []).append(elapsed)
+        else:
+            started_at[event["id"]] = time.perf_counter()
+
+    return {name: summarize(values) for name, values in node_latency.items()}
+
+
+async def benchmark_dev_team(endpoints: int, concurrency: int, latency: float, candidates: int) -> dict:
+    model = FakeChatModel(latency=latency, latency_jitter=latency / 2, endpoints=endpoints, tables=max(1, endpoints // 5), score_sequence=[6, 9])
+    scheduler = LLMScheduler(max_concurrency=concurrency or None)
+    telemetry = Telemetry()
+    agents = dev_team.DevTeamAgents(model, model, candidates=candidates, scheduler=scheduler, telemetry=telemetry)
+    config = {"configurable": {"agents": agents, "budget": dev_team.create_budget()}, "recursion_limit": 1000}
+    inputs = {"messages": [HumanMessage(content=dev_team.description)], "SystemDescription": dev_team.description}
+
+    started = time.perf_counter()
+    nodes = await timed_stream(dev_team.graph, inputs, config)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "graph": "dev_team",
+        "endpoints": endpoints,
+        "concurrency": concurrency or "unlimited",
+        "seconds": elapsed,
+        "llm_calls": model.calls,
+        "llm_calls_per_second": model.calls / elapsed,
+        "endpoints_per_second": endpoints / elapsed,
+        "nodes": nodes,
+        "scheduler": scheduler.stats(),
+        "telemetry": telemetry.report(),
+    }
+
+
+async def benchmark_research_agent(runs: int, concurrency: int, latency: float) -> dict:
+    model = FakeChatModel(latency=latency, latency_jitter=latency / 2)
+    config = {"configurable": {"model": model}, "recursion_limit": 10}
+    goal = "What is the weather today?"
+    semaphore = asyncio.Semaphore(concurrency or runs)
+    run_seconds = []
+    node_latency = {}
+
+    async def run_once():
+        async with semaphore:
+            started = time.perf_counter()
+            nodes = await timed_stream(research_agent.graph, {"messages": [HumanMessage(content=goal)], "ResearchGoal": goal}, config)
+            run_seconds.append(time.perf_counter() - started)
+            for name, summary in nodes.items():
+                node_latency.setdefault(name, []).append(summary["mean"])
+
+    started = time.perf_counter()
+    # the research tools print as they run, keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*[run_once() for _ in range(runs)])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "graph": "research_agent",
+        "runs": runs,
+        "concurrency": concurrency or "unlimited",
+        "seconds": elapsed,
+        "runs_per_second": runs / elapsed,
+        "run_latency": summarize(run_seconds),
+        "nodes": {name: summarize(values) for name, values in node_latency.items()},
+    }
+
+
+class StandInSearchClient:
+    # local stand-in for WebSearchClient, counts the backend requests that get past the tool cache
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+
+    def search(self, query: str) -> list[dict]:
+        self.requests += 1
+        time.sleep(self.latency)
+        return [{"url": "https://example.com", "content": f"results for {query}"}]
+
+    async def asearch(self, query: str) -> list[dict]:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return [{"url": "https://example.com", "content": f"results for {query}"}]
+
+
+async def benchmark_tool_cache(callers: int, latency: float) -> dict:
+    # research_agent's cached search with a stand-in client: callers ask the same question at the same
+    # time with different spelling (coalesced into one request), then again once it is cached (hits)
+    stand_in = StandInSearchClient(latency)
+    original_client = research_agent.web_search_client
+    research_agent.web_search_client = stand_in
+    research_agent.tool_cache.clear()
+    before = research_agent.tool_cache.stats()
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*[research_agent.asearch_web("Apple stock news" if index % 2 else "  apple   STOCK news ") for index in range(callers)])
+        concurrent_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(callers):
+            research_agent.search_web("apple stock news")
+        cached_seconds = time.perf_counter() - started
+    finally:
+        research_agent.web_search_client = original_client
+
+    stats = research_agent.tool_cache.stats()
+    return {
+        "graph": "tool_cache",
+        "callers": callers,
+        "backend_requests": stand_in.requests,
+        "concurrent_seconds": concurrent_seconds,
+        "cached_seconds": cached_seconds,
+        **{key: stats[key] - before[key] for key in ("hits", "misses", "coalesced")},
+    }
+
+
+def fake_worker_agents(endpoints: int, latency: float, candidates: int, workers: int) -> dev_team.DevTeamAgents:
+    # WorkerPool agents factory, module level so the spawned worker processes can import it
+    model = FakeChatModel(latency=latency, latency_jitter=latency / 2, endpoints=endpoints, tables=max(1, endpoints // 5), score_sequence=[6, 9])
+    return dev_team.DevTeamAgents(model, model, candidates=candidates, telemetry=Telemetry())
+
+
+async def benchmark_workers(endpoints: int, workers: int, latency: float, candidates: int) -> dict:
+    # the code writers on 0 (in process) to N worker processes, the architects always run in this process
+    model = FakeChatModel(latency=latency, latency_jitter=latency / 2, endpoints=endpoints, tables=max(1, endpoints // 5), score_sequence=[6, 9])
+    telemetry = Telemetry()
+    agents = dev_team.DevTeamAgents(model, model, candidates=candidates, telemetry=telemetry)
+    budget = dev_team.create_budget()
+    config = {"configurable": {"agents": agents, "budget": budget}, "recursion_limit": 1000}
+    inputs = {"messages": [HumanMessage(content=dev_team.description)], "SystemDescription": dev_team.description}
+
+    pool = WorkerPool(workers, functools.partial(fake_worker_agents, endpoints, latency, candidates)).start() if workers else None
+    try:
+        if pool is not None:
+            config["configurable"]["worker_pool"] = pool
+        started = time.perf_counter()
+        final_state = await dev_team.graph.ainvoke(inputs, config=config)
+        elapsed = time.perf_counter() - started
+    finally:
+        if pool is not None:
+            pool.close()
+
+    return {
+        "graph": "workers",
+        "endpoints": endpoints,
+        "workers": workers,
+        "seconds": elapsed,
+        "code_files": len(final_state["LambdaFunctionList"]),
+        "llm_calls": budget.report()["calls"],
+        # the calls made in the worker processes are merged back into the run's telemetry
+        "telemetry_calls": telemetry.report()["llm_calls"],
+        "endpoints_per_second": endpoints / elapsed,
+    }
+
+
+async def benchmark_tail_latency(endpoints: int, latency: float, hedge_quantile: float, attempts: int) -> dict:
+    # a fake model where a few calls are very slow and a few replies fail validation, with and without hedging and repair.
+    # The graph runs twice on the same agents and the second run is measured, hedging only starts once an agent has latency samples
+    model = FakeChatModel(latency=latency, latency_jitter=latency / 2, slow_rate=0.02, slow_latency=latency * 40, malformed_rate=0.02,
+                          endpoints=endpoints, tables=max(1, endpoints // 5), score_sequence=[6, 9])
+    telemetry = Telemetry()
+    agents = dev_team.DevTeamAgents(model, model, telemetry=telemetry, call_options={"hedge_quantile": hedge_quantile, "attempts": attempts})
+    config = {"configurable": {"agents": agents, "budget": dev_team.create_budget()}, "recursion_limit": 1000}
+    inputs = {"messages": [HumanMessage(content=dev_team.description)], "SystemDescription": dev_team.description}
+
+    nodes = {}
+    error = None
+    try:
+        await dev_team.graph.ainvoke(inputs, config=config)
+        before = telemetry.report()
+        config["configurable"]["budget"] = dev_team.create_budget()
+        started = time.perf_counter()
+        nodes = await timed_stream(dev_team.graph, inputs, config)
+        elapsed = time.perf_counter() - started
+    except Exception as e:
+        before = {"agents": {}}
+        error = type(e).__name__
+        elapsed = 0.0
+
+    report = telemetry.report()
+    lambdas = nodes.get("lambda_developer_agent", summarize([]))
+    return {
+        "graph": "tail_latency",
+        "endpoints": endpoints,
+        "hedge_quantile": hedge_quantile,
+        "attempts": attempts,
+        "seconds": elapsed,
+        "error": error,
+        "lambda_p95": lambdas["p95"],
+        "lambda_max": lambdas["max"],
+        **{key: sum(agent[key] - before["agents"].get(name, {}).get(key, 0) for name, agent in report["agents"].items())
+           for key in ("calls", "parse_failures", "repairs", "hedges", "hedge_wins")},
+    }
+
+
+async def benchmark_model_tiers(endpoints: int, latency: float, tiered: bool) -> dict:
+    # every writer and reviewer call on one large model, or routed by a ModelRouter to a small model four times as fast.
+    # Reviews score 6 then 9, so a simple endpoint gets a small first draft and is escalated for its second
+    large_model = FakeChatModel(model_name="fake-large", latency=latency, latency_jitter=latency / 2, endpoints=endpoints, tables=max(1, endpoints // 5), score_sequence=[6, 9])
+    small_model = FakeChatModel(model_name="fake-small", latency=latency / 4, latency_jitter=latency / 8, score_sequence=[6, 9])
+    telemetry = Telemetry()
+    budget = dev_team.create_budget()
+    agents = dev_team.DevTeamAgents(large_model, large_model, telemetry=telemetry, tier_models=(small_model, large_model) if tiered else None)
+    config = {"configurable": {"agents": agents, "budget": budget}, "recursion_limit": 1000}
+    inputs = {"messages": [HumanMessage(content=dev_team.description)], "SystemDescription": dev_team.description}
+
+    started = time.perf_counter()
+    await dev_team.graph.ainvoke(inputs, config=config)
+    elapsed = time.perf_counter() - started
+
+    report = telemetry.report()
+    scores = [max(entry["scores"]) for entry in budget.report()["artifacts"].values() if entry["scores"]]
+    return {
+        "graph": "model_tiers",
+        "endpoints": endpoints,
+        "tiered": tiered,
+        "seconds": elapsed,
+        "small_calls": small_model.calls,
+        "large_calls": large_model.calls,
+        "mean_final_score": sum(scores) / len(scores) if scores else 0.0,
+        "tiers": report["tiers"],
+        "routing": report["routing"],
+    }
+
+
+def full_state_payloads(state: dict) -> list[dict]:
+    # what send_to_developer sent each branch before the compact LambdaDeveloperInput, a copy of the whole state
+    return [{**state, "CurrentEndpointIndex": index} for index in range(len(state["APIDefinition"].ENDPOINTS))]
+
+
+async def benchmark_fanout_memory(endpoints: int) -> dict:
+    # peak Python memory of a checkpointed run (every Send payload is serialized into the checkpoint) and the
+    # pickled size of the fan-out payloads, compact versus a copy of the full state per endpoint
+    model = FakeChatModel(endpoints=endpoints, tables=max(1, endpoints // 5))
+    agents = dev_team.DevTeamAgents(model, model)
+    config = {"configurable": {"agents": agents, "budget": dev_team.create_budget(), "thread_id": "benchmark"}, "recursion_limit": 1000}
+    inputs = {"messages": [HumanMessage(content=dev_team.description)], "SystemDescription": dev_team.description}
+    app = dev_team.create_graph(InMemorySaver(serde=JsonPlusSerializer(allowed_msgpack_modules=dev_team.checkpoint_types)))
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    await app.ainvoke(inputs, config=config)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # rebuild the state the fan-out saw, right after the database design
+    state = dict((await app.aget_state(config)).values)
+    state["LambdaFunctionList"] = []
+    compact = [send.arg for send in dev_team.send_to_developer(state)]
+    full = full_state_payloads(state)
+
+    return {
+        "graph": "fanout_memory",
+        "endpoints": endpoints,
+        "seconds": elapsed,
+        "peak_memory_bytes": peak,
+        "compact_payload_bytes": sum(len(pickle.dumps(payload)) for payload in compact),
+        "full_state_payload_bytes": sum(len(pickle.dumps(payload)) for payload in full),
+    }
+
+
+def synthetic_history(days: int):
+    # a yfinance style daily history (timezone aware index, dividend and split columns) for the stock output benchmark
+    import numpy
+    import pandas
+
+    index = pandas.bdate_range(end="2026-10-16", periods=days, tz="America/New_York", name="Date")
+    close = 100 + numpy.cumsum(numpy.random.default_rng(0).normal(0, 1, days))
+    return pandas.DataFrame({"Open": close - 0.5, "High": close + 1, "Low": close - 1, "Close": close, "Volume": numpy.full(days, 1_000_000),
+                             "Dividends": 0.0, "Stock Splits": 0.0}, index=index)
+
+
+def records_history(data) -> list[dict]:
+    # the row wise stock_search output before compact_history
+    data = data.reset_index()
+    data_list = data.to_dict(orient='records')
+    for row in data_list:
+        row["Date"] = row["Date"].strftime("%Y-%m-%d")
+
+    return data_list
+
+
+def benchmark_stock_output(days: int, repeats: int = 20) -> dict:
+    data = synthetic_history(days)
+    result = {"graph": "stock_output", "days": days}
+    for name, encode in (("records", records_history), ("compact", compact_history)):
+        started = time.perf_counter()
+        for _ in range(repeats):
+            content = json.dumps(encode(data.copy()))
+        result[name] = {"seconds": (time.perf_counter() - started) / repeats, "tokens": estimate_tokens([content])}
+
+    return result
+
+
+def print_result(result: dict):
+    if result["graph"] == "stock_output":
+        records, compact = result["records"], result["compact"]
+        print(f"stock_output    days={result['days']:<5} records {records['seconds'] * 1000:7.2f}ms {records['tokens']:7d} tokens  "
+              f"compact {compact['seconds'] * 1000:7.2f}ms {compact['tokens']:6d} tokens  ({records['tokens'] / compact['tokens']:.0f}x fewer tokens, "
+              f"{records['seconds'] / compact['seconds']:.1f}x faster)")
+        return
+
+    if result["graph"] == "tail_latency":
+        print(f"tail_latency    endpoints={result['endpoints']:<4} hedge={str(result['hedge_quantile']):<5} attempts={result['attempts']} {result['seconds']:8.3f}s  "
+              f"lambda p95 {result['lambda_p95']:.3f}s max {result['lambda_max']:.3f}s  {result['calls']:5d} calls  {result['parse_failures']} parse failures, {result['repairs']} repairs, "
+              f"{result['hedges']} hedges ({result['hedge_wins']} won){'  failed: ' + result['error'] if result['error'] else ''}")
+        return
+
+    if result["graph"] == "tool_cache":
+        print(f"tool_cache      callers={result['callers']:<4} {result['backend_requests']} backend requests  {result['misses']} misses  "
+              f"{result['coalesced']} coalesced ({result['concurrent_seconds'] * 1000:.1f}ms)  {result['hits']} hits ({result['cached_seconds'] * 1000:.1f}ms)")
+        return
+
+    if result["graph"] == "model_tiers":
+        print(f"model_tiers     endpoints={result['endpoints']:<4} tiered={str(result['tiered']):<5} {result['seconds']:8.3f}s  "
+              f"{result['small_calls']:5d} small calls  {result['large_calls']:5d} large calls  mean final score {result['mean_final_score']:.2f}")
+        return
+
+    if result["graph"] == "workers":
+        print(f"workers         endpoints={result['endpoints']:<4} workers={result['workers']:<3} {result['seconds']:8.3f}s  "
+              f"{result['code_files']:4d} lambdas  {result['llm_calls']:5d} calls ({result['telemetry_calls']} in telemetry)  {result['endpoints_per_second']:7.1f} endpoints/s")
+        return
+
+    if result["graph"] == "fanout_memory":
+        print(f"fanout_memory   endpoints={result['endpoints']:<4} {result['seconds']:8.3f}s  peak {result['peak_memory_bytes'] / 2 ** 20:7.1f} MiB  "
+              f"Send payloads {result['compact_payload_bytes'] / 2 ** 10:9.1f} KiB (full state copies {result['full_state_payload_bytes'] / 2 ** 10:9.1f} KiB)")
+        return
+
+    if result["graph"] == "dev_team":
+        print(f"dev_team        endpoints={result['endpoints']:<4} concurrency={str(result['concurrency']):<9} "
+              f"{result['seconds']:8.3f}s  {result['llm_calls']:5d} calls  {result['llm_calls_per_second']:8.1f} calls/s  {result['endpoints_per_second']:7.1f} endpoints/s")
+    else:
+        print(f"research_agent  runs={result['runs']:<9} concurrency={str(result['concurrency']):<9} "
+              f"{result['seconds']:8.3f}s  p95 run {result['run_latency']['p95']:.3f}s  {result['runs_per_second']:8.1f} runs/s")
+
+    for name, summary in result["nodes"].items():
+        print(f"    {name:<36} n={summary['count']:<4} mean {summary['mean'] * 1000:8.1f}ms  p95 {summary['p95'] * 1000:8.1f}ms  max {summary['max'] * 1000:8.1f}ms")
+
+
+async def main(args):
+    results = []
+    for endpoints in args.endpoints:
+        for concurrency in args.concurrency:
+            result = await benchmark_dev_team(endpoints, concurrency, args.latency, args.candidates)
+            print_result(result)
+            results.append(result)
+
+    for concurrency in args.concurrency:
+        result = await benchmark_research_agent(args.research_runs, concurrency, args.latency)
+        print_result(result)
+        results.append(result)
+
+    for endpoints in args.memory_endpoints:
+        result = await benchmark_fanout_memory(endpoints)
+        print_result(result)
+        results.append(result)
+
+    result = await benchmark_tool_cache(args.tool_cache_callers, args.latency)
+    print_result(result)
+    results.append(result)
+
+    for days in args.stock_days:
+        result = benchmark_stock_output(days)
+        print_result(result)
+        results.append(result)
+
+    for workers in args.workers:
+        result = await benchmark_workers(args.worker_endpoints, workers, args.latency, args.candidates)
+        print_result(result)
+        results.append(result)
+
+    for hedge_quantile, attempts in ((None, 1), (None, 3), (0.95, 3)):
+        result = await benchmark_tail_latency(args.tail_endpoints, args.latency, hedge_quantile, attempts)
+        print_result(result)
+        results.append(result)
+
+    for tiered in (False, True):
+        result = await benchmark_model_tiers(args.tier_endpoints, args.latency, tiered)
+        print_result(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the dev_team and research_agent graphs against an offline fake model")
+    parser.add_argument("--endpoints", type=int, nargs="*", default=[1, 10, 50, 200], help="API sizes to generate")
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[0, 8, 32], help="scheduler concurrency caps, 0 means unlimited")
+    parser.add_argument("--latency", type=float, default=0.05, help="base fake model latency in seconds, up to half of it again is added as jitter")
+    parser.add_argument("--candidates", type=int, default=1, help="drafts per review round")
+    parser.add_argument("--research-runs", type=int, default=20, help="research_agent runs per concurrency setting")
+    parser.add_argument("--memory-endpoints", type=int, nargs="*", default=[200], help="API sizes for the fan-out memory benchmark")
+    parser.add_argument("--workers", type=int, nargs="*", default=[0, 1, 2, 4], help="worker process counts for the scaling benchmark, 0 runs the writers in process")
+    parser.add_argument("--worker-endpoints", type=int, default=200, help="API size for the worker scaling benchmark")
+    parser.add_argument("--stock-days", type=int, nargs="*", default=[5, 21, 252, 1260], help="trading days of price history for the stock_search output benchmark")
+    parser.add_argument("--tool-cache-callers", type=int, default=20, help="concurrent and repeated identical searches for the research tool cache check")
+    parser.add_argument("--tail-endpoints", type=int, default=100, help="API size for the slow and malformed reply benchmark")
+    parser.add_argument("--tier-endpoints", type=int, default=100, help="API size for the model tier routing benchmark")
+    parser.add_argument("--json", help="also write the results to this file")
+    asyncio.run(main(parser.parse_args()))
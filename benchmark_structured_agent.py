@@ -0,0 +1,67 @@
+import os
+import timeit
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_openai import AzureChatOpenAI
+from CodeBaseModels import CodeFile, CodeReview
+from LambdaDeveloperAgent import LambdaDeveloperAgent
+
+# Measures the per-call overhead StructuredAgent adds before a request goes on the wire.
+# No request is sent, the model is only used to bind the structured output schema.
+
+iterations = int(os.environ.get("BENCHMARK_ITERATIONS", "2000"))
+
+model = AzureChatOpenAI(
+    model="gpt-4o-mini",
+    temperature=0,
+    api_key="benchmark",
+    azure_endpoint="https://benchmark.invalid",
+    api_version=os.environ.get("AZURE_OPENAI_API_VERSION", "2024-08-01-preview"))
+
+lambda_developer = LambdaDeveloperAgent(model)
+writer_agent = lambda_developer._writer_agent
+reviewer_agent = lambda_developer._reviewer_agent
+system_message_template = writer_agent._system_message_template._template
+
+merge_data = {
+    "name": "CreatePost",
+    "description": "Create a new blog post",
+    "request": "title, content, author",
+    "response": "post id",
+    "schema": ["{\"TABLE_NAME\": \"BlogPosts\", \"PRIMARY_KEY\": \"PostId\"}"] * 5,
+    "code": "def lambda_handler(event, context):\n    return {}\n" * 20,
+    "review": "Add input validation and logging." * 10,
+}
+
+
+def reply_overhead_before(return_type):
+    # what StructuredAgent.reply did on every call before the runnable was bound once
+    system_message = SystemMessage(content=system_message_template.format(**merge_data))
+    human_message = HumanMessage(content="Create or improve the Lambda Function".format(**merge_data))
+    model.with_structured_output(return_type)
+    return [system_message, human_message]
+
+
+def reply_overhead_after(agent):
+    # what StructuredAgent.reply does now, the bound runnable is reused
+    return agent._build_messages("Create or improve the Lambda Function", merge_data)
+
+
+def agent_construction():
+    # what develop_lambda paid on every invocation before the agent was shared
+    LambdaDeveloperAgent(model)
+
+
+def report(title, seconds, count):
+    print(f"{title:<45} {seconds / count * 1e6:10.1f} us/call")
+
+
+if __name__ == "__main__":
+    print(f"{iterations} iterations\n")
+
+    report("reply overhead before (CodeFile)", timeit.timeit(lambda: reply_overhead_before(CodeFile), number=iterations), iterations)
+    report("reply overhead after (CodeFile)", timeit.timeit(lambda: reply_overhead_after(writer_agent), number=iterations), iterations)
+    report("reply overhead before (CodeReview)", timeit.timeit(lambda: reply_overhead_before(CodeReview), number=iterations), iterations)
+    report("reply overhead after (CodeReview)", timeit.timeit(lambda: reply_overhead_after(reviewer_agent), number=iterations), iterations)
+
+    construction_iterations = max(1, iterations // 10)
+    report("LambdaDeveloperAgent construction", timeit.timeit(agent_construction, number=construction_iterations), construction_iterations)
@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import sys
+import time
+
+# Command line entry point for both graphs.  The graph modules only build (and never run) their
+# graphs on import, everything that touches the network or the file system happens here.
+#
+#   python cli.py run dev-team [--description-file FILE] [--thread-id ID] [--previous-run ID|FOLDER] [--checkpoint-db FILE] [--workers N] [--render-graph] [--ndjson]
+#   python cli.py resume --thread-id ID [--checkpoint-db FILE] [--ndjson]
+#   python cli.py batch DESCRIPTIONS.jsonl|FOLDER [--concurrency N] [--workers N] [--output-folder FOLDER]
+#   python cli.py run research [GOAL] [--ndjson]
+#
+# --ndjson writes the run's progress events to stdout, one JSON object per line, and everything else to stderr
+#   python cli.py render-graph {dev-team,research} [--offline] [--output FILE]
+
+running_folder = os.path.dirname(os.path.abspath(__file__))
+
+
+def worker_pool(workers: int):
+    # a pool of processes for the code writers, or nothing when the run stays in this process
+    if not workers:
+        return contextlib.nullcontext()
+
+    import dev_team
+    from WorkerPool import WorkerPool
+    return WorkerPool(workers, dev_team.create_worker_agents)
+
+
+def ndjson_writer(stream):
+    started = time.perf_counter()
+
+    def write(event: dict):
+        # the final state is not JSON, the artifacts and reports it leads to are written as usual
+        line = {"elapsed": round(time.perf_counter() - started, 3), **{key: value for key, value in event.items() if key != "state"}}
+        stream.write(json.dumps(line, default=str) + "\n")
+        stream.flush()
+
+    return write
+
+
+async def consume(events, emit=None) -> dict:
+    # drains an event stream, passing each event to emit, and returns the last one
+    last_event = {}
+    async for event in events:
+        if emit is not None:
+            emit(event)
+        last_event = event
+
+    return last_event
+
+
+def load_graph(name: str):
+    # imported on demand so `render-graph research` does not pay for the dev team modules and the other way round
+    if name == "dev-team":
+        import dev_team
+        return dev_team.graph
+
+    import research_agent
+    return research_agent.graph
+
+
+def render_graph(graph, path: str, offline: bool = False) -> str:
+    # offline writes the Mermaid source, online renders a PNG through the mermaid.ink service
+    drawable = graph.get_graph(xray=1)
+    if offline:
+        path = os.path.splitext(path)[0] + ".mmd"
+        with open(path, "w") as f:
+            f.write(drawable.draw_mermaid())
+    else:
+        with open(path, "wb") as f:
+            f.write(drawable.draw_mermaid_png())
+
+    return path
+
+
+def run_dev_team(args) -> int:
+    from langchain_core.messages import HumanMessage
+    from ArtifactWriter import ArtifactWriter
+    import dev_team
+
+    # set the output folder to the dev folder + the run id, todays date in YYYYMMDDhhmmss format by default
+    dev_folder = os.path.join(running_folder, "dev", args.thread_id)
+    os.makedirs(dev_folder, exist_ok=True)
+
+    if args.render_graph:
+        print(f"Graph written to {render_graph(dev_team.graph, os.path.join(dev_folder, 'dev_team_graph.png'), args.offline)}")
+
+    description = dev_team.description
+    if args.description_file:
+        with open(args.description_file) as f:
+            description = f.read()
+
+    # an incremental run updates an earlier run's design and only rewrites the artifacts whose inputs changed
+    previous_run = None
+    if args.previous_run:
+        from PreviousRun import PreviousRun
+        previous_folder = args.previous_run if os.path.isdir(args.previous_run) else os.path.join(running_folder, "dev", args.previous_run)
+        previous_run = PreviousRun.load(previous_folder)
+        print(f"Updating the run in {previous_folder}")
+
+    # stream the run and write each artifact as soon as the node that produced it finishes,
+    # the nodes are coroutines so the lambda fan-out shares one event loop
+    artifact_writer = ArtifactWriter(dev_folder)
+    budget = dev_team.create_budget()
+    agents = dev_team.create_default_agents(dev_team.limit_fraction(args.workers))
+    with worker_pool(args.workers) as pool:
+        final_state = asyncio.run(consume(dev_team.astream_dev_team(
+            {"messages": [HumanMessage(content=description)], "SystemDescription": description},
+            args.thread_id,
+            artifact_writer,
+            budget,
+            checkpoint_path=args.checkpoint_db,
+            resume=args.resume,
+            agents=agents,
+            worker_pool=pool,
+            previous_run=previous_run
+        ), args.emit)).get("state", {})
+
+    print(f"Wrote {len(artifact_writer.written)} artifacts to {dev_folder}")
+    for path, error in artifact_writer.errors:
+        print(f"  failed to write {path}: {error}")
+
+    telemetry_report = dev_team.write_run_reports(artifact_writer, budget, agents.telemetry)
+
+    budget_report = budget.report()
+    print(f"LLM budget: {budget_report['calls']} calls, ~{budget_report['tokens']} tokens")
+    for artifact, spent in final_state.get('BudgetReport', {}).items():
+        print(f"  {artifact}: {spent}")
+
+    if agents.cache is not None:
+        print(f"LLM cache: {agents.cache.stats()}")
+
+    print(f"LLM scheduler: {agents.scheduler.stats()}")
+    print(f"Telemetry: {telemetry_report['llm_calls']} calls, {telemetry_report['prompt_tokens']} prompt / {telemetry_report['completion_tokens']} completion tokens, "
+          f"last to finish: {', '.join(telemetry_report['critical_path'])}")
+
+    return 1 if artifact_writer.errors else 0
+
+
+def run_batch(args) -> int:
+    import dev_team_batch
+
+    descriptions = dev_team_batch.load_descriptions(args.input)
+    output_folder = args.output_folder or dev_team_batch.default_output_folder(running_folder)
+    print(f"Running {len(descriptions)} descriptions, {args.concurrency} at a time, into {output_folder}")
+
+    with worker_pool(args.workers) as pool:
+        report = asyncio.run(dev_team_batch.run_batch(descriptions, output_folder, args.concurrency, args.max_connections, worker_pool=pool))
+
+    print(f"{report['succeeded']} of {report['descriptions']} descriptions succeeded in {report['seconds']:.1f}s, "
+          f"{report['descriptions_per_hour']:.1f} descriptions/hour, {report['llm_calls']} LLM calls")
+
+    return 1 if report["failed"] else 0
+
+
+def run_research(args) -> int:
+    import research_agent
+
+    research_folder = os.path.join(running_folder, "research_agent")
+    os.makedirs(research_folder, exist_ok=True)
+
+    if args.render_graph:
+        print(f"Graph written to {render_graph(research_agent.graph, os.path.join(research_folder, 'research_agent_graph.png'), args.offline)}")
+
+    goal = args.goal or research_agent.research_goal
+    answer = asyncio.run(consume(research_agent.astream_research(goal, config={"configurable": {"thread_id": 42}, "recursion_limit": 10}), args.emit))
+
+    research_agent.print_message("Final Response", answer.get("text", ""))
+    print(f"Tool cache: {research_agent.tool_cache.stats()}")
+
+    with open(os.path.join(research_folder, "telemetry.json"), "w") as f:
+        json.dump(research_agent.telemetry.report(), f, indent=4)
+    with open(os.path.join(research_folder, "telemetry.prom"), "w") as f:
+        f.write(research_agent.telemetry.prometheus())
+
+    return 0
+
+
+def render(args) -> int:
+    default_name = "dev_team_graph.png" if args.graph == "dev-team" else "research_agent_graph.png"
+    print(f"Graph written to {render_graph(load_graph(args.graph), args.output or default_name, args.offline)}")
+    return 0
+
+
+def add_dev_team_options(parser: argparse.ArgumentParser, resuming: bool = False):
+    if resuming:
+        parser.add_argument("--thread-id", required=True, help="id of the run to continue")
+    else:
+        parser.add_argument("--thread-id", default=datetime.datetime.now().strftime("%Y%m%d%H%M%S"), help="run id, also names the dev/<thread-id> output folder")
+    parser.add_argument("--checkpoint-db", default=os.environ.get('DEV_TEAM_CHECKPOINT_DB') or None, help="SQLite file used to checkpoint the run")
+    add_worker_options(parser)
+
+
+def add_worker_options(parser: argparse.ArgumentParser):
+    parser.add_argument("--workers", type=int, default=int(os.environ.get('DEV_TEAM_WORKERS') or 0), help="worker processes for the code writers, 0 runs them in this process")
+
+
+def add_stream_options(parser: argparse.ArgumentParser):
+    parser.add_argument("--ndjson", action="store_true", help="stream progress events (and answer tokens) to stdout as newline delimited JSON")
+
+
+def add_render_options(parser: argparse.ArgumentParser, flag: bool):
+    if flag:
+        parser.add_argument("--render-graph", action="store_true", help="also draw the graph into the output folder")
+    parser.add_argument("--offline", action="store_true", help="write the Mermaid source instead of calling mermaid.ink for a PNG")
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run and inspect the dev team and research agent graphs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run a graph")
+    graphs = run_parser.add_subparsers(dest="graph", required=True)
+
+    dev_team_parser = graphs.add_parser("dev-team", help="design and write an AWS API with the dev team agents")
+    dev_team_parser.add_argument("--description-file", help="text file with the system description, the blog API example by default")
+    dev_team_parser.add_argument("--resume", action="store_true", help="continue the checkpointed run with the given --thread-id")
+    dev_team_parser.add_argument("--previous-run", help="thread id or output folder of an earlier run, only the lambdas and terraform scripts whose inputs changed are written again")
+    add_dev_team_options(dev_team_parser)
+    add_render_options(dev_team_parser, flag=True)
+    add_stream_options(dev_team_parser)
+    dev_team_parser.set_defaults(handler=run_dev_team)
+
+    research_parser = graphs.add_parser("research", help="answer a research goal with the research agent")
+    research_parser.add_argument("goal", nargs="?", help="what to research, the General Conference example by default")
+    add_render_options(research_parser, flag=True)
+    add_stream_options(research_parser)
+    research_parser.set_defaults(handler=run_research)
+
+    resume_parser = commands.add_parser("resume", help="continue a checkpointed dev team run")
+    add_dev_team_options(resume_parser, resuming=True)
+    add_render_options(resume_parser, flag=True)
+    add_stream_options(resume_parser)
+    resume_parser.set_defaults(handler=run_dev_team, resume=True, description_file=None, previous_run=None)
+
+    batch_parser = commands.add_parser("batch", help="run the dev team over many system descriptions in one process")
+    batch_parser.add_argument("input", help="JSONL file of {\"id\", \"description\"} objects, or a folder of .txt/.md descriptions")
+    batch_parser.add_argument("--concurrency", type=int, default=int(os.environ.get('BATCH_CONCURRENCY') or 4), help="descriptions run at the same time")
+    batch_parser.add_argument("--max-connections", type=int, default=20, help="size of each model's HTTP connection pool")
+    batch_parser.add_argument("--output-folder", help="dev/batch-<timestamp> by default, one sub folder per description")
+    add_worker_options(batch_parser)
+    batch_parser.set_defaults(handler=run_batch)
+
+    render_parser = commands.add_parser("render-graph", help="draw a graph without running it")
+    render_parser.add_argument("graph", choices=["dev-team", "research"])
+    render_parser.add_argument("--output", help="output file, <graph>_graph.png (or .mmd with --offline) by default")
+    add_render_options(render_parser, flag=False)
+    render_parser.set_defaults(handler=render)
+
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    args = create_parser().parse_args(argv)
+    args.emit = None
+    if getattr(args, "ndjson", False):
+        # the events own stdout, the agents' demo output and the run summary go to stderr
+        args.emit = ndjson_writer(sys.stdout)
+        with contextlib.redirect_stdout(sys.stderr):
+            return args.handler(args)
+
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
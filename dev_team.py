@@ -1,29 +1,218 @@
 import os
-import datetime
-from typing import Annotated
-from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI, AzureChatOpenAI
+import sys
+from typing import Annotated, TypedDict
 from langgraph.graph import END, START, StateGraph, MessagesState
+from langchain_core.runnables import RunnableConfig
 from langgraph.types import Send
-from APIArchitectAgent import APIDefinition, APIArchitectAgent
+from APIArchitectAgent import APIDefinition, APIEndpoint, APIArchitectAgent
 from DynamoDBArchitectAgent import DynamoTables, DynamoDBArchitectAgent
 from CodeBaseModels import CodeFile
 from LambdaDeveloperAgent import LambdaDeveloperAgent
 from DynamoDBTerraformAgent import DynamoDBTerraformAgent
 from APIGatewayTerraformAgent import APIGatewayTerraformAgent
+from LLMCache import LLMCache
+from LLMScheduler import LLMScheduler
+from CallBudget import CallBudget
+from ArtifactWriter import ArtifactWriter, astream_progress
+from Telemetry import Telemetry, timed_node, emit_progress
+from SchemaIndex import build_schema_index, schema_slice
+from WorkerPool import WorkerPool
+from PreviousRun import PreviousRun, write_manifest
+from ModelRouter import ModelRouter, is_simple_endpoint
+
+# SQLite checkpoints are optional, install langgraph-checkpoint-sqlite to enable resuming runs
+try:
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+except ImportError:
+    AsyncSqliteSaver = None
 
-# model used for planning and other general cognative tasks
-# general_model = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-general_model = AzureChatOpenAI(model="gpt-4o-mini", temperature=0, api_version=os.environ['AZURE_OPENAI_API_VERSION'])
-
-# model used for coding
-# coding_model = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-coding_model = AzureChatOpenAI(model="gpt-4o-mini", temperature=0, api_version=os.environ['AZURE_OPENAI_API_VERSION'])
+# state types the checkpointer is allowed to restore
+checkpoint_types = [("APIArchitectAgent", "APIDefinition"), ("APIArchitectAgent", "APIEndpoint"), ("DynamoDBArchitectAgent", "DynamoTables"), ("CodeBaseModels", "CodeFile")]
 
-# setting for code review
+# default setting for code review, each run gets its own CallBudget built from these
 min_quality_score = 8
 max_review_iterations = 3
 
+# number of drafts written and reviewed in parallel on each review round
+review_candidates = int(os.environ.get('REVIEW_CANDIDATES', '1'))
+
+
+def _env_int(name):
+    return int(os.environ[name]) if os.environ.get(name) else None
+
+
+def _env_float(name):
+    return float(os.environ[name]) if os.environ.get(name) else None
+
+
+def create_models(http_async_clients: tuple = (None, None)):
+    # imported here, langchain_openai is slow to import and only needed once a run starts
+    from langchain_openai import ChatOpenAI, AzureChatOpenAI
+
+    # a long-lived caller (the batch runner) passes one pooled httpx.AsyncClient per model so
+    # connections and TLS sessions are reused between runs, otherwise openai builds its own
+    general_client, coding_client = http_async_clients
+
+    # model used for planning and other general cognative tasks
+    # general_model = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    general_model = AzureChatOpenAI(model="gpt-4o-mini", temperature=0, api_version=os.environ['AZURE_OPENAI_API_VERSION'], http_async_client=general_client)
+
+    # model used for coding
+    # coding_model = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    coding_model = AzureChatOpenAI(model="gpt-4o-mini", temperature=0, api_version=os.environ['AZURE_OPENAI_API_VERSION'], http_async_client=coding_client)
+
+    return general_model, coding_model
+
+
+def create_tier_models(http_async_client=None) -> tuple:
+    # small and large deployments for the code writers and reviewers, set LLM_SMALL_MODEL and LLM_LARGE_MODEL
+    # (e.g. gpt-4o-mini and gpt-4o) to route calls between them, None keeps every call on coding_model
+    if not os.environ.get('LLM_SMALL_MODEL') or not os.environ.get('LLM_LARGE_MODEL'):
+        return None
+
+    from langchain_openai import AzureChatOpenAI
+
+    return tuple(AzureChatOpenAI(model=os.environ[name], temperature=0, api_version=os.environ['AZURE_OPENAI_API_VERSION'], http_async_client=http_async_client)
+                 for name in ('LLM_SMALL_MODEL', 'LLM_LARGE_MODEL'))
+
+
+class DevTeamAgents:
+    # the agents hold no per-call state, so one set is built and shared between all graph branches
+    def __init__(self, general_model, coding_model, candidates: int = 1, cache: LLMCache = None, scheduler: LLMScheduler = None, telemetry: Telemetry = None,
+                 call_options: dict = None, tier_models: tuple = None):
+        self.cache = cache
+        self.scheduler = scheduler
+        self.telemetry = telemetry
+        # with (small, large) tier_models the review loops pick a tier per call, see ModelRouter
+        self.router = ModelRouter(*tier_models, telemetry=telemetry) if tier_models else None
+        # call_options are StructuredAgent's deadline, repair and hedging settings, see create_call_options
+        agent_options = {"cache": cache, "scheduler": scheduler, "telemetry": telemetry, **(call_options or {})}
+        writer_options = {**agent_options, "router": self.router}
+        self.api_architect = APIArchitectAgent(general_model, **agent_options)
+        self.dynamodb_architect = DynamoDBArchitectAgent(general_model, **agent_options)
+        self.dynamo_terraform_writer = DynamoDBTerraformAgent(coding_model, candidates=candidates, **writer_options)
+        self.api_gateway_terraform_writer = APIGatewayTerraformAgent(coding_model, candidates=candidates, **writer_options)
+        self.lambda_developer = LambdaDeveloperAgent(coding_model, candidates=candidates, **writer_options)
+
+
+def create_cache() -> LLMCache:
+    # optional on-disk cache of LLM replies, enabled by setting LLM_CACHE_PATH (e.g. .cache/llm_cache.sqlite)
+    return LLMCache(os.environ['LLM_CACHE_PATH']) if os.environ.get('LLM_CACHE_PATH') else None
+
+
+# with worker processes the main process only makes the architect calls, two per run, so it keeps
+# this fraction of the LLM_* rate limits and the workers running the code writers split the rest
+ARCHITECT_LIMIT_FRACTION = 0.1
+
+
+def limit_fraction(workers: int, worker: bool = False) -> float:
+    # the part of the rate limits for the main process, or for one of `workers` worker processes
+    if not workers:
+        return 1.0
+
+    return (1 - ARCHITECT_LIMIT_FRACTION) / workers if worker else ARCHITECT_LIMIT_FRACTION
+
+
+def create_scheduler(fraction: float = 1.0) -> LLMScheduler:
+    # every agent shares one scheduler so the fan-out stays inside the deployment's rate limits,
+    # processes that each run their own scheduler get a fraction of the limits (see limit_fraction)
+    def limit(name):
+        value = _env_int(name)
+        return max(1, int(value * fraction)) if value else None
+
+    return LLMScheduler(
+        requests_per_minute=limit('LLM_REQUESTS_PER_MINUTE'),
+        tokens_per_minute=limit('LLM_TOKENS_PER_MINUTE'),
+        max_concurrency=limit('LLM_MAX_CONCURRENCY'))
+
+
+def create_telemetry() -> Telemetry:
+    # per agent, node and artifact latency, token and retry numbers, set the LLM_*_COST_PER_MILLION prices to add cost
+    return Telemetry(
+        prompt_cost_per_million=_env_float('LLM_PROMPT_COST_PER_MILLION'),
+        completion_cost_per_million=_env_float('LLM_COMPLETION_COST_PER_MILLION'))
+
+
+def create_call_options() -> dict:
+    # per call deadline, attempts per reply (a reply that fails to parse is asked for again with the error) and
+    # the latency quantile after which a slow call gets a hedged duplicate, set LLM_TIMEOUT_SECONDS / LLM_REPLY_ATTEMPTS / LLM_HEDGE_QUANTILE
+    options = {"timeout": _env_float('LLM_TIMEOUT_SECONDS'), "hedge_quantile": _env_float('LLM_HEDGE_QUANTILE')}
+    if _env_int('LLM_REPLY_ATTEMPTS'):
+        options["attempts"] = _env_int('LLM_REPLY_ATTEMPTS')
+
+    return options
+
+
+def create_default_agents(fraction: float = 1.0) -> DevTeamAgents:
+    general_model, coding_model = create_models()
+    return DevTeamAgents(general_model, coding_model, review_candidates, create_cache(), create_scheduler(fraction), create_telemetry(), create_call_options(),
+                         create_tier_models())
+
+
+def create_worker_agents(workers: int) -> DevTeamAgents:
+    # agents for one WorkerPool process, the rate limits are split between the workers and the parent process
+    return create_default_agents(limit_fraction(workers, worker=True))
+
+
+default_agents: DevTeamAgents = None
+
+
+def get_agents(config: RunnableConfig) -> DevTeamAgents:
+    # a run can bring its own agents (a benchmark with a fake model for example),
+    # otherwise the Azure backed agents are built on first use
+    global default_agents
+    agents = config.get("configurable", {}).get("agents")
+    if agents is not None:
+        return agents
+
+    if default_agents is None:
+        default_agents = create_default_agents()
+
+    return default_agents
+
+
+def get_telemetry(config: RunnableConfig) -> Telemetry:
+    return get_agents(config).telemetry
+
+
+def create_budget() -> CallBudget:
+    # run-wide cap on LLM calls/tokens, set LLM_MAX_CALLS / LLM_MAX_TOKENS to enable it
+    return CallBudget(
+        max_calls=_env_int('LLM_MAX_CALLS'),
+        max_tokens=_env_int('LLM_MAX_TOKENS'),
+        min_quality_score=min_quality_score,
+        max_review_iterations=max_review_iterations)
+
+
+async def call_writer(config: RunnableConfig, agent: str, method: str, *args, budget: CallBudget, artifact: str, **kwargs):
+    # the code writers run on the worker pool when the run has one, otherwise in this process
+    worker_pool = config.get("configurable", {}).get("worker_pool")
+    if worker_pool is not None:
+        return await worker_pool.run(agent, method, args, kwargs, budget=budget, artifact=artifact, telemetry=get_telemetry(config))
+
+    return await getattr(getattr(get_agents(config), agent), method)(*args, budget=budget, artifact=artifact, **kwargs)
+
+
+def get_budget(config: RunnableConfig) -> CallBudget:
+    # the budget travels with the run config so parallel runs do not share it
+    budget = config.get("configurable", {}).get("budget")
+    if budget is not None:
+        return budget
+
+    # without one every node would get a budget of its own, that is harmless uncapped but a cap would only hold per node
+    budget = create_budget()
+    if budget.max_calls is not None or budget.max_tokens is not None:
+        raise ValueError("LLM_MAX_CALLS / LLM_MAX_TOKENS cap a whole run, pass the run's CallBudget as config['configurable']['budget']")
+
+    return budget
+
+
+def get_previous_run(config: RunnableConfig) -> PreviousRun:
+    # set for incremental runs, the earlier run whose unchanged artifacts are reused
+    return config.get("configurable", {}).get("previous_run")
+
 
 def add_codefile(left: list[CodeFile], right: list[CodeFile]) -> list[CodeFile]:
     for r in right:
@@ -32,6 +221,10 @@ def add_codefile(left: list[CodeFile], right: list[CodeFile]) -> list[CodeFile]:
     return left
 
 
+def merge_reports(left: dict, right: dict) -> dict:
+    return {**left, **right}
+
+
 # Define the state details
 class DevTeamState(MessagesState):
     SystemDescription: str
@@ -39,123 +232,222 @@ class DevTeamState(MessagesState):
     APIGatewayTerraformScript: CodeFile
     DatabaseArchitecture: DynamoTables
     DatabaseTerraformScript: CodeFile
-    CurrentEndpointIndex: int
+    SchemaIndex: dict[str, list[int]]
     LambdaFunctionList: Annotated[list[CodeFile], add_codefile]
+    LambdaFiles: Annotated[dict[str, str], merge_reports]
+    BudgetReport: Annotated[dict, merge_reports]
+
+
+# what each lambda branch is sent instead of a copy of the whole state
+class LambdaDeveloperInput(TypedDict):
+    Endpoint: APIEndpoint
+    DatabaseSchema: str
+    SimpleEndpoint: bool
 
 
 # Define the function that calls the model
-def architect_api(state: DevTeamState):
+async def architect_api(state: DevTeamState, config: RunnableConfig):
     # extract data from the state
     system_description = state['SystemDescription']
+    budget = get_budget(config)
+    previous_run = get_previous_run(config)
 
-    # call the agent
-    api_architect = APIArchitectAgent(general_model)
-    api_definition = api_definition = api_architect.create_design(system_description)
+    # call the agent, an incremental run has it update the earlier design
+    api_definition = await get_agents(config).api_architect.acreate_design(system_description, budget, previous_run.api_definition if previous_run else None)
+
+    # reserve a first review round for every lambda and both terraform scripts
+    budget.expect(len(api_definition.ENDPOINTS) + 2)
 
     # update the state
-    return {"APIDefinition": api_definition}
+    return {"APIDefinition": api_definition, "BudgetReport": {"api_definition.json": budget.artifact_report("api_definition.json")}}
 
 
-def design_database(state: DevTeamState):
+async def design_database(state: DevTeamState, config: RunnableConfig):
     # extract data from the state
     system_description = state['SystemDescription']
     endpoints = state['APIDefinition'].ENDPOINTS
     endpoint_list = [e.model_dump_json() for e in endpoints]
+    budget = get_budget(config)
+
+    previous_run = get_previous_run(config)
+
+    # call the agent, an incremental run has it update the earlier design
+    database_architecture = await get_agents(config).dynamodb_architect.acreate_design(system_description, endpoint_list, budget,
+                                                                                       previous_run.database_architecture if previous_run else None)
 
-    # call the agent
-    dynamodb_architect = DynamoDBArchitectAgent(general_model)
-    database_architecture = dynamodb_architect.create_design(system_description, endpoint_list)
+    # work out once which tables each endpoint touches, so every lambda branch gets only its slice of the schema
+    schema_index = build_schema_index(endpoints, database_architecture.TABLES)
+
+    if previous_run is not None:
+        emit_progress({"type": "design_diff", **previous_run.diff(state['APIDefinition'], database_architecture)})
 
     # update the state
-    return {"DatabaseArchitecture": database_architecture}
+    return {"DatabaseArchitecture": database_architecture, "SchemaIndex": schema_index, "BudgetReport": {"database_schema.json": budget.artifact_report("database_schema.json")}}
 
 
-def write_database_terraform(state: DevTeamState):
+async def write_database_terraform(state: DevTeamState, config: RunnableConfig):
     # extract data from the state
     database_design: DynamoTables = state['DatabaseArchitecture']
     database_table_list = [dd.model_dump_json() for dd in database_design.TABLES]
+    budget = get_budget(config)
+    previous_run = get_previous_run(config)
 
-    # call the agent
-    dynamo_terraform_writer = DynamoDBTerraformAgent(coding_model)
-    terraform_script = dynamo_terraform_writer.write_terraform(database_table_list, min_quality_score, max_review_iterations)
+    # an incremental run keeps the earlier script when the tables did not change
+    terraform_script = previous_run.database_terraform(database_table_list) if previous_run else None
+    if terraform_script is not None:
+        budget.reuse("Database.tf")
+    else:
+        terraform_script = await call_writer(config, "dynamo_terraform_writer", "awrite_terraform", database_table_list, budget=budget, artifact="Database.tf")
 
     # update the state
-    return {"DatabaseTerraformScript": terraform_script}
+    return {"DatabaseTerraformScript": terraform_script, "BudgetReport": {"Database.tf": budget.artifact_report("Database.tf")}}
 
 
-def write_apigateway_terraform(state: DevTeamState):
+async def write_apigateway_terraform(state: DevTeamState, config: RunnableConfig):
     # extract data from the state
     endpoint_list = [e.model_dump_json() for e in state['APIDefinition'].ENDPOINTS]
+    budget = get_budget(config)
+    previous_run = get_previous_run(config)
 
-    # call the agent
-    api_gateway_terraform_writer = APIGatewayTerraformAgent(coding_model)
-    terraform_script = api_gateway_terraform_writer.write_terraform(endpoint_list, min_quality_score, max_review_iterations)
+    # an incremental run keeps the earlier script when the endpoints did not change
+    terraform_script = previous_run.api_gateway_terraform(endpoint_list) if previous_run else None
+    if terraform_script is not None:
+        budget.reuse("APIGateway.tf")
+    else:
+        terraform_script = await call_writer(config, "api_gateway_terraform_writer", "awrite_terraform", endpoint_list, budget=budget, artifact="APIGateway.tf")
 
     # update the state
-    return {"APIGatewayTerraformScript": terraform_script}
+    return {"APIGatewayTerraformScript": terraform_script, "BudgetReport": {"APIGateway.tf": budget.artifact_report("APIGateway.tf")}}
 
 
-def develop_lambda(state: DevTeamState):
-    # extract data from the state
-    endpoint = state['APIDefinition'].ENDPOINTS[state['CurrentEndpointIndex']]
-    database_design = state['DatabaseArchitecture']
-    database_table_list = [dd.model_dump_json() for dd in database_design.TABLES]
+async def develop_lambda(state: LambdaDeveloperInput, config: RunnableConfig):
+    # extract data from the branch input
+    endpoint = state['Endpoint']
+    budget = get_budget(config)
+    previous_run = get_previous_run(config)
 
-    # call the agent
-    lambda_developer = LambdaDeveloperAgent(coding_model)
-    lambda_function = lambda_developer.write_lambda(endpoint.NAME, endpoint.DESCRIPTION, endpoint.REQUEST, endpoint.RESPONSE, database_table_list, min_quality_score, max_review_iterations)
+    # an incremental run keeps the earlier lambda when neither the endpoint nor its tables changed
+    lambda_function = previous_run.lambda_function(endpoint, state['DatabaseSchema']) if previous_run else None
+    if lambda_function is not None:
+        budget.reuse(endpoint.NAME)
+    else:
+        lambda_function = await call_writer(config, "lambda_developer", "awrite_lambda", endpoint.NAME, endpoint.DESCRIPTION, endpoint.REQUEST, endpoint.RESPONSE, state['DatabaseSchema'], budget=budget, artifact=endpoint.NAME,
+                                            simple=state.get('SimpleEndpoint', False))
 
     # update the state
-    return {"LambdaFunctionList": [lambda_function]}
+    return {"LambdaFunctionList": [lambda_function], "LambdaFiles": {endpoint.NAME: lambda_function.FILENAME}, "BudgetReport": {endpoint.NAME: budget.artifact_report(endpoint.NAME)}}
 
     
 def send_to_developer(state: DevTeamState):
+    # every table is serialized once, and endpoints with the same slice of the schema share one prompt string
+    table_json = [table.model_dump_json() for table in state['DatabaseArchitecture'].TABLES]
+    schema_index = state.get('SchemaIndex', {})
+    schemas = {}
+
     result = []
-    for index in range(len(state['APIDefinition'].ENDPOINTS)):
-        state_copy = state.copy()
-        state_copy['CurrentEndpointIndex'] = index
-        result.append(Send("lambda_developer_agent", state_copy))
+    for endpoint in state['APIDefinition'].ENDPOINTS:
+        positions = tuple(schema_index.get(endpoint.NAME, []))
+        if positions not in schemas:
+            schemas[positions] = str(schema_slice(table_json, list(positions)))
+        result.append(Send("lambda_developer_agent", {"Endpoint": endpoint, "DatabaseSchema": schemas[positions], "SimpleEndpoint": is_simple_endpoint(endpoint.METHOD, len(positions))}))
 
     return result
 
 
-# Define a new graph
-workflow = StateGraph(DevTeamState)
+def create_graph(checkpointer=None):
+    # builds and compiles the graph, no models are created until a node runs
+    workflow = StateGraph(DevTeamState)
+
+    # Define the two nodes we will cycle between
+    workflow.add_node("api_architect_agent", timed_node("api_architect_agent", architect_api, get_telemetry))
+    workflow.add_node("database_architect_agent", timed_node("database_architect_agent", design_database, get_telemetry))
+    workflow.add_node("lambda_developer_agent", timed_node("lambda_developer_agent", develop_lambda, get_telemetry), input_schema=LambdaDeveloperInput)
+    workflow.add_node("database_terraform_writer_agent", timed_node("database_terraform_writer_agent", write_database_terraform, get_telemetry))
+    workflow.add_node("api_gateway_terraform_writer_agent", timed_node("api_gateway_terraform_writer_agent", write_apigateway_terraform, get_telemetry))
 
-# Define the two nodes we will cycle between
-workflow.add_node("api_architect_agent", architect_api)
-workflow.add_node("database_architect_agent", design_database)
-workflow.add_node("lambda_developer_agent", develop_lambda)
-workflow.add_node("database_terraform_writer_agent", write_database_terraform)
-workflow.add_node("api_gateway_terraform_writer_agent", write_apigateway_terraform)
+    workflow.add_edge(START, "api_architect_agent")
+    workflow.add_edge("api_architect_agent", "database_architect_agent")
+    workflow.add_edge("api_architect_agent", "api_gateway_terraform_writer_agent")
+    workflow.add_edge("database_architect_agent", "database_terraform_writer_agent")
+    workflow.add_edge("api_gateway_terraform_writer_agent", END)
+    workflow.add_edge("database_terraform_writer_agent", END)
+    workflow.add_conditional_edges("database_architect_agent", send_to_developer, ["lambda_developer_agent"])
+    workflow.add_edge("lambda_developer_agent", END)
 
-workflow.add_edge(START, "api_architect_agent")
-workflow.add_edge("api_architect_agent", "database_architect_agent")
-workflow.add_edge("api_architect_agent", "api_gateway_terraform_writer_agent")
-workflow.add_edge("database_architect_agent", "database_terraform_writer_agent")
-workflow.add_edge("api_gateway_terraform_writer_agent", END)
-workflow.add_edge("database_terraform_writer_agent", END)
-workflow.add_conditional_edges("database_architect_agent", send_to_developer, ["lambda_developer_agent"])
-workflow.add_edge("lambda_developer_agent", END)
+    return workflow.compile(checkpointer=checkpointer)
 
-app = workflow.compile()
 
-# get the current running folder
-running_folder = os.path.dirname(os.path.abspath(__file__))
+# compiled graph for LangGraph Studio (langgraph.json) and other importers
+graph = create_graph()
 
-# set the current folder to the dev folder + todays date in YYYYMMDDhhmmss format
-dev_folder = running_folder + "/dev/" + datetime.datetime.now().strftime("%Y%m%d%H%M%S")
 
-# create the folder if it does not exist
-if not os.path.exists(dev_folder):
-    os.makedirs(dev_folder, exist_ok=True)
+async def _with_manifest(events, artifact_writer: ArtifactWriter):
+    # the manifest lets a later incremental run find the lambda written for each endpoint
+    async for event in events:
+        if event["type"] == "run_finished":
+            write_manifest(artifact_writer, event["state"])
+        yield event
 
-# draw the graph
-png_bytes = app.get_graph(xray=1).draw_mermaid_png()
 
-with open(f"{dev_folder}/dev_team_graph.png", "wb") as f:
-    f.write(png_bytes)
+async def astream_dev_team(inputs, thread_id: str, artifact_writer: ArtifactWriter, budget: CallBudget, checkpoint_path: str = None, resume: bool = False,
+                           agents: DevTeamAgents = None, worker_pool: WorkerPool = None, previous_run: PreviousRun = None):
+    # the run as an async iterator of progress events (see astream_progress), the last one, run_finished, carries the final state
+    config = {"configurable": {"thread_id": thread_id, "budget": budget}, "recursion_limit": 1000}
+    if agents is not None:
+        config["configurable"]["agents"] = agents
+    if worker_pool is not None:
+        config["configurable"]["worker_pool"] = worker_pool
+    if previous_run is not None:
+        config["configurable"]["previous_run"] = previous_run
 
+    if checkpoint_path is None:
+        if resume:
+            raise ValueError("Resuming a run needs a checkpoint database")
+        async for event in _with_manifest(astream_progress(graph, inputs, config, artifact_writer), artifact_writer):
+            yield event
+        return
+
+    if AsyncSqliteSaver is None:
+        raise ImportError("Checkpointing needs the langgraph-checkpoint-sqlite package")
+
+    async with aiosqlite.connect(checkpoint_path) as connection:
+        checkpointer = AsyncSqliteSaver(connection, serde=JsonPlusSerializer(allowed_msgpack_modules=checkpoint_types))
+        checkpointed_app = create_graph(checkpointer)
+
+        if resume:
+            # nodes, and fan-out branches, that finished before the failure are restored from the
+            # checkpoint and only the missing ones run again
+            snapshot = await checkpointed_app.aget_state(config)
+            if not snapshot.values:
+                raise ValueError(f"No checkpoint found for thread {thread_id}")
+            artifact_writer.write_update(snapshot.values)
+            inputs = None
+
+        async for event in _with_manifest(astream_progress(checkpointed_app, inputs, config, artifact_writer), artifact_writer):
+            yield event
+
+
+async def run_dev_team(inputs, thread_id: str, artifact_writer: ArtifactWriter, budget: CallBudget, checkpoint_path: str = None, resume: bool = False,
+                       agents: DevTeamAgents = None, worker_pool: WorkerPool = None, previous_run: PreviousRun = None) -> dict:
+    final_state = {}
+    async for event in astream_dev_team(inputs, thread_id, artifact_writer, budget, checkpoint_path, resume, agents, worker_pool, previous_run):
+        if event["type"] == "run_finished":
+            final_state = event["state"]
+
+    return final_state
+
+
+def write_run_reports(artifact_writer: ArtifactWriter, budget: CallBudget, telemetry: Telemetry) -> dict:
+    # budget and telemetry reports next to the run's artifacts, telemetry both as JSON and in the Prometheus text format
+    artifact_writer.write_json("budget_report.json", budget.report())
+    telemetry_report = telemetry.report()
+    artifact_writer.write_json("telemetry.json", telemetry_report)
+    artifact_writer.write_text("telemetry.prom", telemetry.prometheus())
+
+    return telemetry_report
+
+
+# example system description used when the module is run directly
 description = """
 Build an API that will allow the user to create, read, update and delete blog posts.
 Each blog post should have a title, content, author, date created and average rating.
@@ -166,54 +458,8 @@ Besides the basic CRUD operations, the API should also allow the user to:
 3. Search for blog posts by author or by date
 """
 
-# for s in app.stream( 
-#     {"messages": [HumanMessage(content=description)], "SystemDescription": description},
-#     config={"configurable": {"thread_id": 42}, "recursion_limit": 1000}):
-#     print(s)
-
-# Use the Runnable
-final_state = app.invoke(
-    {"messages": [HumanMessage(content=description)], "SystemDescription": description},
-    config={"configurable": {"thread_id": 42}, "recursion_limit": 1000}
-)
-
-try:
-    # save the API definition to a file
-    with open(f"{dev_folder}/api_definition.json", "w") as f:
-        api_definition: APIDefinition = final_state['APIDefinition']
-        f.write(api_definition.model_dump_json(indent=4))
-except:
-    pass                
-
-try:
-    # save the database schema to a file
-    with open(f"{dev_folder}/database_schema.json", "w") as f:
-        database_architecture: DynamoTables = final_state['DatabaseArchitecture']
-        f.write(database_architecture.model_dump_json(indent=4))
-except:
-    pass
 
-try:
-    # save the terraform script to a file
-    terraform_script: CodeFile = final_state['APIGatewayTerraformScript']
-    with open(f"{dev_folder}/APIGateway.tf", "w") as f:
-        f.write(terraform_script.RAW_CODE)
-except:
-    pass
-
-try:
-    # save the terraform script to a file
-    terraform_script: CodeFile = final_state['DatabaseTerraformScript']
-    with open(f"{dev_folder}/Database.tf", "w") as f:
-        f.write(terraform_script.RAW_CODE)
-except:
-    pass
-
-try:
-    # save the individual lambda functions to files
-    lambda_functions: list[CodeFile] = final_state['LambdaFunctionList']
-    for lambda_function in lambda_functions:
-        with open(f"{dev_folder}/{lambda_function.FILENAME}", "w") as f:
-            f.write(lambda_function.RAW_CODE)
-except:
-    pass
\ No newline at end of file
+if __name__ == "__main__":
+    # kept so `python dev_team.py [options]` still works, see cli.py for every command
+    from cli import main
+    sys.exit(main(["run", "dev-team"] + sys.argv[1:]))
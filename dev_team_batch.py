@@ -0,0 +1,139 @@
+import asyncio
+import datetime
+import json
+import os
+import re
+import time
+from langchain_core.messages import HumanMessage
+from ArtifactWriter import ArtifactWriter
+import dev_team
+
+# Runs the dev team graph over a queue of system descriptions in one process.  The models, their
+# pooled HTTP clients, the LLM cache and the rate limit scheduler are built once and shared by every
+# description; each description gets its own agents (for its telemetry), budget and output folder.
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", text).strip("._") or "description"
+
+
+def load_descriptions(path: str) -> list[dict]:
+    # a JSONL file with {"id": ..., "description": ...} objects (or bare strings) per line,
+    # or a folder of .txt/.md files, one description per file named after the file
+    descriptions = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if os.path.splitext(name)[1] in (".txt", ".md"):
+                with open(os.path.join(path, name)) as f:
+                    descriptions.append({"id": os.path.splitext(name)[0], "description": f.read()})
+    else:
+        with open(path) as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if isinstance(entry, str):
+                    entry = {"description": entry}
+                descriptions.append({"id": str(entry.get("id") or f"line{line_number}"), "description": entry["description"]})
+
+    # ids name the output folders, so they have to be safe file names and unique
+    seen = {}
+    for entry in descriptions:
+        slug = _slug(entry["id"])
+        seen[slug] = seen.get(slug, 0) + 1
+        entry["id"] = slug if seen[slug] == 1 else f"{slug}_{seen[slug]}"
+
+    return descriptions
+
+
+def create_http_clients(max_connections: int) -> tuple:
+    # one pooled client per model, kept open for the whole batch
+    import httpx
+
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return httpx.AsyncClient(limits=limits), httpx.AsyncClient(limits=limits)
+
+
+async def run_description(entry: dict, batch_id: str, output_folder: str, models: tuple, cache, scheduler, worker_pool=None, tier_models: tuple = None) -> dict:
+    artifact_writer = ArtifactWriter(os.path.join(output_folder, entry["id"]))
+    budget = dev_team.create_budget()
+    agents = dev_team.DevTeamAgents(*models, dev_team.review_candidates, cache, scheduler, dev_team.create_telemetry(), dev_team.create_call_options(),
+                                    tier_models)
+    description = entry["description"]
+
+    started = time.perf_counter()
+    try:
+        await dev_team.run_dev_team({"messages": [HumanMessage(content=description)], "SystemDescription": description},
+                                    f"{batch_id}-{entry['id']}", artifact_writer, budget, agents=agents, worker_pool=worker_pool)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - started
+
+    telemetry_report = dev_team.write_run_reports(artifact_writer, budget, agents.telemetry)
+    status = "failed" if error else "ok"
+    print(f"[{status}] {entry['id']} in {elapsed:.1f}s, {telemetry_report['llm_calls']} LLM calls, {len(artifact_writer.written)} files" + (f": {error}" if error else ""))
+
+    return {
+        "id": entry["id"],
+        "status": status,
+        "error": error,
+        "seconds": elapsed,
+        "llm_calls": telemetry_report["llm_calls"],
+        "prompt_tokens": telemetry_report["prompt_tokens"],
+        "completion_tokens": telemetry_report["completion_tokens"],
+        "files": len(artifact_writer.written),
+        "write_errors": artifact_writer.errors,
+    }
+
+
+async def run_batch(descriptions: list[dict], output_folder: str, concurrency: int = 4, max_connections: int = 20, models: tuple = None, worker_pool=None,
+                    tier_models: tuple = None) -> dict:
+    batch_id = os.path.basename(os.path.normpath(output_folder))
+    os.makedirs(output_folder, exist_ok=True)
+
+    # shared for the whole batch: models and their connection pools, cache and rate limits
+    http_clients = None
+    if models is None:
+        http_clients = create_http_clients(max_connections)
+        models = dev_team.create_models(http_clients)
+        tier_models = dev_team.create_tier_models(http_clients[1])
+    cache = dev_team.create_cache()
+    scheduler = dev_team.create_scheduler(dev_team.limit_fraction(worker_pool.workers if worker_pool is not None else 0))
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(entry):
+        async with semaphore:
+            return await run_description(entry, batch_id, output_folder, models, cache, scheduler, worker_pool, tier_models)
+
+    started = time.perf_counter()
+    try:
+        results = await asyncio.gather(*[run_one(entry) for entry in descriptions])
+    finally:
+        if http_clients is not None:
+            for client in http_clients:
+                await client.aclose()
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "batch_id": batch_id,
+        "descriptions": len(results),
+        "succeeded": sum(1 for result in results if result["status"] == "ok"),
+        "failed": sum(1 for result in results if result["status"] != "ok"),
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "descriptions_per_hour": len(results) / elapsed * 3600 if elapsed else 0.0,
+        "llm_calls": sum(result["llm_calls"] for result in results),
+        "scheduler": scheduler.stats(),
+        "cache": cache.stats() if cache is not None else None,
+        "results": results,
+    }
+    with open(os.path.join(output_folder, "batch_report.json"), "w") as f:
+        json.dump(report, f, indent=4, default=str)
+
+    return report
+
+
+def default_output_folder(running_folder: str) -> str:
+    return os.path.join(running_folder, "dev", "batch-" + datetime.datetime.now().strftime("%Y%m%d%H%M%S"))
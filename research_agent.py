@@ -1,12 +1,16 @@
-import os, datetime, json
-from langchain_openai import ChatOpenAI, AzureChatOpenAI
-from typing import Annotated, Optional
+import os, sys, datetime, json, operator, re, time
+from typing import Annotated, Optional, TypedDict
 from langgraph.graph import END, START, StateGraph, MessagesState
+from langgraph.types import Send
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langgraph.prebuilt import ToolNode, tools_condition
-from langchain_community.tools import TavilySearchResults, WikipediaQueryRun
-from langchain_community.utilities import WikipediaAPIWrapper
-from langchain_core.messages import HumanMessage
-import yfinance as yf
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
+from ResearchClients import StockClient, WebSearchClient, WikipediaClient
+from Telemetry import Telemetry, timed_node
+from ToolCache import ToolCache
+from MessageCompaction import compact_messages
+from ResearchPlannerAgent import ResearchPlannerAgent
 
 
 # ANSI escape codes for color
@@ -16,11 +20,81 @@ RESET = "\033[0m"
 def print_message(title, content):
     print(RED + "**** " + title + " ****" + RESET + "\n" + content + "\n")
 
-# model = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-model = AzureChatOpenAI(model="gpt-4o-mini", temperature=0, api_version=os.environ['AZURE_OPENAI_API_VERSION'])
+def create_model():
+    # imported here, langchain_openai is slow to import and only needed once a run starts
+    from langchain_openai import ChatOpenAI, AzureChatOpenAI
+
+    # model = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    return AzureChatOpenAI(model="gpt-4o-mini", temperature=0, api_version=os.environ['AZURE_OPENAI_API_VERSION'])
+
+
+# latency, token and tool call numbers for every run in this process
+telemetry = Telemetry()
+
+# older tool results are cut down once a prompt would go over this many (estimated) tokens, 0 turns compaction off
+max_prompt_tokens = int(os.environ.get('RESEARCH_MAX_PROMPT_TOKENS') or 8000)
+
+# search results are reused within and across runs of this process, news goes stale faster than an encyclopedia
+tool_cache = ToolCache({"search_web": 15 * 60, "search_wikipedia": 24 * 60 * 60, "stock_history": 60 * 60})
+
+
+# compound goals are split into at most this many sub-questions, researched in parallel; 1 turns the planner off
+max_sub_questions = int(os.environ.get('RESEARCH_MAX_SUB_QUESTIONS') or 4)
+
 
 class ResearchState(MessagesState):
     ResearchGoal: str
+    SubQuestions: list[str]
+    Findings: Annotated[list[dict], operator.add]
+
+
+# one sub-question's tool loop, with its own conversation
+class SubQuestionState(MessagesState):
+    ResearchGoal: str
+
+
+# what each parallel branch is sent
+class SubQuestionInput(TypedDict):
+    Question: str
+
+
+# one pooled client per backend for the whole process, created on the first search
+web_search_client = WebSearchClient()
+wikipedia_client = WikipediaClient()
+stock_client = StockClient()
+
+# the network calls behind the tools look the client up when they run, so a local stand-in assigned to
+# web_search_client, wikipedia_client or stock_client still goes through tool_cache
+def _search_web(query: str) -> list[dict]:
+    return web_search_client.search(query)
+
+
+async def _asearch_web(query: str) -> list[dict]:
+    return await web_search_client.asearch(query)
+
+
+def _search_wikipedia(query: str) -> str:
+    return wikipedia_client.search(query)
+
+
+async def _asearch_wikipedia(query: str) -> str:
+    return await wikipedia_client.asearch(query)
+
+
+def _stock_history(symbol: str, start_date: str, end_date: str, interval: str = "auto") -> dict:
+    return stock_client.history(symbol, start_date, end_date, interval)
+
+
+async def _astock_history(symbol: str, start_date: str, end_date: str, interval: str = "auto") -> dict:
+    return await stock_client.ahistory(symbol, start_date, end_date, interval)
+
+
+search_web = tool_cache.cached(_search_web, "search_web")
+asearch_web = tool_cache.cached(_asearch_web, "search_web")
+search_wikipedia = tool_cache.cached(_search_wikipedia, "search_wikipedia")
+asearch_wikipedia = tool_cache.cached(_asearch_wikipedia, "search_wikipedia")
+stock_history = tool_cache.cached(_stock_history, "stock_history")
+astock_history = tool_cache.cached(_astock_history, "stock_history")
 
 
 # fake weather search
@@ -32,48 +106,59 @@ def weather_search(query: Annotated[str, "The search query to run"]) -> Annotate
     return result
 
 
+def print_stock_results(history: dict):
+    try:
+        print_message("Stock Query results", json.dumps(history))
+    except Exception as e:
+        print_message("Error", "Error converting query results to JSON: " + str(e))
+
+
 # stock search tool using Yahoo Finance
-def stock_search(symbol: Annotated[str, "The stock ticker symbol (e.g., 'AAPL' for Apple, 'GOOGL' for Alphabet)"], start_date: Annotated[str, "The start date of the data being requested in YYYY-MM-DD format"], end_date: Annotated[str, "The end date of the data being requested in YYYY-MM-DD format"]) -> Annotated[Optional[list[dict]], "A list of dictionaries where each dictionary represents a row of stock data with keys like 'Date', 'Open', 'High', 'Low', 'Close', 'Volume', etc."]:
+def stock_search(symbol: Annotated[str, "The stock ticker symbol (e.g., 'AAPL' for Apple, 'GOOGL' for Alphabet)"], start_date: Annotated[str, "The start date of the data being requested in YYYY-MM-DD format"], end_date: Annotated[str, "The end date of the data being requested in YYYY-MM-DD format"], interval: Annotated[str, "'daily', 'weekly', 'monthly' or 'auto' (daily up to two months, weekly up to two years, monthly beyond)"] = "auto") -> Annotated[Optional[dict], "The summary of the period (open, close, change_pct, high, low, volume_total, ...) and the price bars as CSV with a Date,Open,High,Low,Close,Volume header"]:
     """
     Retrieve stock price data for the given stock symbol over a specified date range using Yahoo Finance.
     """
-    print_message("Stock Query", f"Symbol: {symbol}, Start Date: {start_date}, End Date: {end_date}")
+    print_message("Stock Query", f"Symbol: {symbol}, Start Date: {start_date}, End Date: {end_date}, Interval: {interval}")
     try:
-        stock = yf.Ticker(symbol)
-        data = stock.history(start=start_date, end=end_date)  # Get data for the date range
-        
-        if not data.empty:
-            # Convert the DataFrame to a list of dictionaries
-            data.reset_index(inplace=True)  # Make 'Date' a column instead of the index
-            data_list = data.to_dict(orient='records')  # Convert to list of dicts
-            try:
-                # Fix the unseralizable datetime objects
-                for row in data_list:
-                    row["Date"] = row["Date"].strftime("%Y-%m-%d")
-                print_message("Stock Query results", json.dumps(data_list))
-            except Exception as e:
-                print_message("Error", "Error converting query results to JSON: " + str(e))
-            return data_list
-        else:
-            raise ValueError("No data found for the provided symbol and date range.")
+        history = stock_history(symbol, start_date, end_date, interval)
+        print_stock_results(history)
+        return history
     except Exception as e:
         print(f"Error retrieving stock price data: {e}")
         return None
 
 
-# web search tool using Tavily
-def tavily_search(query: Annotated[str, "The search query to run"]) -> Annotated[TavilySearchResults, "The search results"]:
-    """Search the web with the query"""
-    print_message("Web Query", query)
-    # create a Tavily search object
-    search = TavilySearchResults()
-    # run the search
-    result = search.invoke({"query": query})
+async def astock_search(symbol: str, start_date: str, end_date: str, interval: str = "auto") -> Optional[dict]:
+    print_message("Stock Query", f"Symbol: {symbol}, Start Date: {start_date}, End Date: {end_date}, Interval: {interval}")
     try:
-        print_message("Web Search results", json.dumps(result))
+        history = await astock_history(symbol, start_date, end_date, interval)
+        print_stock_results(history)
+        return history
+    except Exception as e:
+        print(f"Error retrieving stock price data: {e}")
+        return None
+
+
+def print_search_results(title: str, result):
+    try:
+        print_message(title, json.dumps(result))
     except:
         print_message("Error", "Error converting search results to JSON")
 
+
+# web search tool using Tavily
+def tavily_search(query: Annotated[str, "The search query to run"]) -> Annotated[list[dict], "The search results"]:
+    """Search the web with the query"""
+    print_message("Web Query", query)
+    result = search_web(query)
+    print_search_results("Web Search results", result)
+    return result
+
+
+async def atavily_search(query: str) -> list[dict]:
+    print_message("Web Query", query)
+    result = await asearch_web(query)
+    print_search_results("Web Search results", result)
     return result
 
 
@@ -81,23 +166,119 @@ def tavily_search(query: Annotated[str, "The search query to run"]) -> Annotated
 def wikipedia_search(query: Annotated[str, "The search query to run"]) -> Annotated[str, "The search results"]:
     """Search Wikipedia with the query"""
     print_message("Wikipedia Query", query)
-    # create a Wikipedia search object
-    search = WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper())
-    # run the search
-    result = search.run(query)
-    try:
-        print_message("Wikipedia Search Results", json.dumps(result))
-    except:
-        print_message("Error", "Error converting search results to JSON")
+    result = search_wikipedia(query)
+    print_search_results("Wikipedia Search Results", result)
+    return result
 
+
+async def awikipedia_search(query: str) -> str:
+    print_message("Wikipedia Query", query)
+    result = await asearch_wikipedia(query)
+    print_search_results("Wikipedia Search Results", result)
     return result
 
 
-tools = [tavily_search, wikipedia_search, weather_search, stock_search]
-llm_with_tools = model.bind_tools(tools)
+def research_tool(func, coroutine=None) -> StructuredTool:
+    # the schema comes from the sync function, the async variant lets ToolNode run the tool calls of one turn concurrently
+    return StructuredTool.from_function(func=telemetry.tool(func), coroutine=telemetry.tool(coroutine, func.__name__) if coroutine else None, name=func.__name__)
+
+
+tools = [research_tool(tavily_search, atavily_search), research_tool(wikipedia_search, awikipedia_search),
+         research_tool(weather_search), research_tool(stock_search, astock_search)]
+default_model = None
+default_llm_with_tools = None
+default_planner = None
+
+
+def get_model(config: RunnableConfig):
+    # a run can bring its own model (a benchmark with a fake model for example),
+    # otherwise the Azure model is built on first use
+    global default_model
+    model = config.get("configurable", {}).get("model")
+    if model is not None:
+        return model
+
+    if default_model is None:
+        default_model = create_model()
+
+    return default_model
+
 
+def get_llm_with_tools(config: RunnableConfig):
+    global default_llm_with_tools
+    if config.get("configurable", {}).get("model") is not None:
+        return get_model(config).bind_tools(tools)
+
+    if default_llm_with_tools is None:
+        default_llm_with_tools = get_model(config).bind_tools(tools)
+
+    return default_llm_with_tools
+
+
+def get_planner(config: RunnableConfig) -> ResearchPlannerAgent:
+    global default_planner
+    if config.get("configurable", {}).get("model") is not None:
+        return ResearchPlannerAgent(get_model(config), max_sub_questions, telemetry=telemetry)
+
+    if default_planner is None:
+        default_planner = ResearchPlannerAgent(get_model(config), max_sub_questions, telemetry=telemetry)
+
+    return default_planner
+
+
+def is_compound(goal: str) -> bool:
+    # more than one sentence or question is worth a planning call, a single question goes straight to research
+    return len([sentence for sentence in re.split(r"(?<=[.?!])\s+|\n+", goal.strip()) if sentence.strip()]) > 1
+
+
+async def plan_research(state: ResearchState, config: RunnableConfig):
+    goal = state['ResearchGoal']
+    if max_sub_questions <= 1 or not is_compound(goal):
+        return {"SubQuestions": [goal]}
+
+    today = datetime.datetime.now().strftime("%Y-%m-%d")
+    questions = await get_planner(config).aplan(goal, today)
+    print_message("Research Plan", "\n".join(questions))
+    return {"SubQuestions": questions}
 
-def research_agent(state: ResearchState):
+
+def send_to_researchers(state: ResearchState):
+    # every sub-question runs its own tool loop at the same time
+    return [Send("research_sub_question", {"Question": question}) for question in state["SubQuestions"]]
+
+
+async def research_sub_question(state: SubQuestionInput, config: RunnableConfig):
+    question = state["Question"]
+    result = await research_loop.ainvoke({"messages": [HumanMessage(content=question)], "ResearchGoal": question}, config)
+    return {"Findings": [{"question": question, "answer": result["messages"][-1].content}]}
+
+
+async def synthesize(state: ResearchState, config: RunnableConfig):
+    # branches finish in any order, the findings are put back in plan order
+    order = {question: position for position, question in enumerate(state["SubQuestions"])}
+    findings = sorted(state["Findings"], key=lambda finding: order.get(finding["question"], len(order)))
+    if len(findings) == 1:
+        return {"messages": [AIMessage(content=findings[0]["answer"])]}
+
+    system_message = """You combine research findings into one answer to the research goal: {research_goal}.
+    Only use the information in the findings, do not add your own opinion, and keep the details (numbers, dates, names) they give.""".format(research_goal=state['ResearchGoal'])
+    findings_text = "\n\n".join(f"Question: {finding['question']}\nFindings: {finding['answer']}" for finding in findings)
+
+    started_at = time.perf_counter()
+    try:
+        llm_response = await get_model(config).ainvoke([SystemMessage(content=system_message), HumanMessage(content=findings_text)])
+    except Exception:
+        telemetry.record_call("research_synthesizer", wall_seconds=time.perf_counter() - started_at, error=True)
+        raise
+
+    usage = llm_response.usage_metadata or {}
+    telemetry.record_call("research_synthesizer", wall_seconds=time.perf_counter() - started_at, prompt_tokens=usage.get("input_tokens", 0), completion_tokens=usage.get("output_tokens", 0))
+    print_message("Synthesized Response", llm_response.content)
+
+    return {"messages": [llm_response]}
+
+
+async def research_agent(state: SubQuestionState, config: RunnableConfig):
     # extract the research goal from the state
     research_goal = state['ResearchGoal']
 
@@ -109,8 +290,17 @@ def research_agent(state: ResearchState):
     You should not share your opinion on the information you get back from the tools, you should only 
     synthesize and summarize the information as it is given to you.""".format(today=today, research_goal=research_goal)
 
-    # call the LLM with the tools
-    llm_response = llm_with_tools.invoke([system_message] + state["messages"])
+    # call the LLM with the tools, the older tool results are shortened when the conversation is over budget
+    messages = compact_messages(state["messages"], config.get("configurable", {}).get("max_prompt_tokens", max_prompt_tokens))
+    started_at = time.perf_counter()
+    try:
+        llm_response = await get_llm_with_tools(config).ainvoke([system_message] + messages)
+    except Exception:
+        telemetry.record_call("research_agent", wall_seconds=time.perf_counter() - started_at, error=True)
+        raise
+
+    usage = llm_response.usage_metadata or {}
+    telemetry.record_call("research_agent", wall_seconds=time.perf_counter() - started_at, prompt_tokens=usage.get("input_tokens", 0), completion_tokens=usage.get("output_tokens", 0))
 
     # display for demo purposes
     try:
@@ -125,40 +315,82 @@ def research_agent(state: ResearchState):
     return {"messages": [llm_response]}
 
 
-graph = StateGraph(ResearchState)
-graph.add_node("tools", ToolNode(tools))
-graph.add_node("research_agent", research_agent)
-
-graph.add_edge(START, "research_agent")
-graph.add_conditional_edges("research_agent", tools_condition, ["tools", END])
-graph.add_edge("tools", "research_agent")
-
-app = graph.compile()
-
-# get the current running folder
-running_folder = os.path.dirname(os.path.abspath(__file__))
-
-# set the current folder to the research folder
-research_folder = running_folder + "/research_agent"
-
-# create the research folder if it does not exist
-if not os.path.exists(research_folder):
-    os.makedirs(research_folder)
-
-# draw the graph
-png_bytes = app.get_graph(xray=1).draw_mermaid_png()
-
-with open(f"{research_folder}/research_agent_graph.png", "wb") as f:
-    f.write(png_bytes)
-
+def create_research_loop():
+    # the tool loop one (sub-)question is researched with
+    workflow = StateGraph(SubQuestionState)
+    workflow.add_node("tools", ToolNode(tools))
+    workflow.add_node("research_agent", timed_node("research_agent", research_agent, lambda config: telemetry))
+
+    workflow.add_edge(START, "research_agent")
+    workflow.add_conditional_edges("research_agent", tools_condition, ["tools", END])
+    workflow.add_edge("tools", "research_agent")
+
+    return workflow.compile()
+
+
+def create_graph(checkpointer=None):
+    # builds and compiles the graph, no model is created until a node runs
+    workflow = StateGraph(ResearchState)
+    workflow.add_node("plan_research", timed_node("plan_research", plan_research, lambda config: telemetry))
+    workflow.add_node("research_sub_question", timed_node("research_sub_question", research_sub_question, lambda config: telemetry), input_schema=SubQuestionInput)
+    workflow.add_node("synthesize", timed_node("synthesize", synthesize, lambda config: telemetry))
+
+    workflow.add_edge(START, "plan_research")
+    workflow.add_conditional_edges("plan_research", send_to_researchers, ["research_sub_question"])
+    workflow.add_edge("research_sub_question", "synthesize")
+    workflow.add_edge("synthesize", END)
+
+    return workflow.compile(checkpointer=checkpointer)
+
+
+# compiled graphs, the full research graph is exported for LangGraph Studio (langgraph.json) and other importers
+research_loop = create_research_loop()
+graph = create_graph()
+
+async def astream_research(goal: str, config: dict = None):
+    # the run as an async iterator of events: node_started / node_finished (subgraph nodes carry the branch they ran in),
+    # plan, token (final answer text as the model writes it) and answer with the complete final answer
+    config = {"recursion_limit": 10, **(config or {})}
+    inputs = {"messages": [HumanMessage(content=goal)], "ResearchGoal": goal}
+    # a single sub-question is answered by its research_agent, several by the synthesizer
+    answer_node = "research_agent"
+    final_state = {}
+    started_at = {}
+
+    async for namespace, mode, chunk in graph.astream(inputs, config=config, stream_mode=["messages", "tasks", "updates", "values"], subgraphs=True):
+        branch = namespace[0].split(":")[0] if namespace else None
+        if mode == "messages":
+            message, metadata = chunk
+            if metadata.get("langgraph_node") == answer_node and isinstance(message.content, str) and message.content and not getattr(message, "tool_calls", None):
+                yield {"type": "token", "node": answer_node, "text": message.content}
+        elif mode == "tasks":
+            event = {"node": chunk["name"], "task_id": chunk["id"]}
+            if branch:
+                event["branch"] = namespace[0]
+            if "result" not in chunk:
+                started_at[chunk["id"]] = time.perf_counter()
+                yield {"type": "node_started", **event}
+            else:
+                seconds = time.perf_counter() - started_at.pop(chunk["id"], time.perf_counter())
+                yield {"type": "node_finished", **event, "seconds": seconds, "error": chunk.get("error")}
+        elif mode == "updates" and not namespace and "plan_research" in chunk:
+            questions = chunk["plan_research"]["SubQuestions"]
+            if len(questions) > 1:
+                answer_node = "synthesize"
+            yield {"type": "plan", "sub_questions": questions}
+        elif mode == "values" and not namespace:
+            final_state = chunk
+
+    yield {"type": "answer", "text": final_state["messages"][-1].content if final_state.get("messages") else ""}
+
+
+# example research goals used when the module is run directly
 research_goal = "What was the topic of Present Russell M. Nelson's most recent message during General Conference?"
 # research_goal = "Who is President Russell M. Nelson?"
 # research_goal = "How has Apple stock done this week?  What news is impacting the stock price?"
 
-final_state = app.invoke(
-    {"messages": [HumanMessage(content=research_goal)], "ResearchGoal": research_goal},
-    config={"configurable": {"thread_id": 42}, "recursion_limit": 10}
-)
-
-print_message("Final Response", final_state["messages"][-1].content)
 
+if __name__ == "__main__":
+    # kept so `python research_agent.py` still works, see cli.py for every command
+    from cli import main
+    sys.exit(main(["run", "research"] + sys.argv[1:]))